@@ -0,0 +1,56 @@
+import streamlit as st
+
+import metrics
+import resilience
+import routing
+
+# Admin page: latency, token usage and cost of the LLM calls made by this server process
+
+
+# Streamlit App
+def main():
+    import pandas as pd
+
+    st.title("LLM Call Metrics")
+
+    st.write(f"Percentiles cover the last {metrics.WINDOW_SECONDS / 60:.0f} minutes; counters cover the lifetime of this server process.")
+
+    summary = pd.DataFrame(metrics.registry.summary())
+    if summary.empty:
+        st.info("No LLM calls have been recorded yet.")
+        return
+
+    # Stages that dominate latency and spend first
+    summary = summary.sort_values(["cost_usd", "duration_p95_s"], ascending=False, na_position="last")
+    # Average prompt size per call, which drives latency and TPM usage
+    summary["prompt_tokens_per_call"] = summary["prompt_tokens"] / summary["calls"]
+    st.subheader("Per app, stage and model")
+    st.dataframe(summary, hide_index=True)
+
+    totals = summary[["calls", "prompt_tokens", "completion_tokens", "cost_usd"]].sum()
+    columns = st.columns(4)
+    columns[0].metric("Calls", f"{totals['calls']:.0f}")
+    columns[1].metric("Prompt tokens", f"{totals['prompt_tokens']:.0f}")
+    columns[2].metric("Completion tokens", f"{totals['completion_tokens']:.0f}")
+    columns[3].metric("Estimated cost", f"${totals['cost_usd']:.4f}")
+
+    st.subheader("Recent calls")
+    st.dataframe(pd.DataFrame(list(metrics.registry.recent_calls)[::-1]), hide_index=True)
+
+    # Current routing decisions; a degraded primary hands its stages to the fallback model
+    st.subheader("Model routing")
+    routes = [
+        {
+            "app": app, "stage": stage, "primary": primary, "fallback": fallback,
+            "primary_status": routing.degradation(primary, budget) or "ok",
+            "primary_circuit": resilience.get_breaker(primary).state(),
+            "routed_to": routing.choose_model(app, stage, primary),
+        }
+        for (app, stage), (primary, fallback, budget) in routing.routes.items()
+    ]
+    st.dataframe(pd.DataFrame(routes), hide_index=True)
+
+    st.download_button("Download Prometheus metrics", metrics.registry.render_prometheus(), file_name="llm_metrics.prom", mime="text/plain")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import streamlit as st
+
+import pipeline
+
+# All tools as pages of one Streamlit app: streamlit run app.py
+# Every page runs in this one server process, so the OpenAI client and its connection pool, the response cache,
+# the rate limiters (one global quota per model), the metrics registry and the job queue are loaded once and
+# shared by all pages and sessions. The page scripts are unchanged and can still be run on their own.
+
+
+# Streamlit App
+def main():
+    st.set_page_config(page_title="Problem Transformer")
+
+    pages = {
+        "Problems": [
+            st.Page("transformer.py", title="Trend to Opportunity Transformer", default=True),
+            st.Page("proban.py", title="Problem Analyser"),
+        ],
+        "Solutions": [
+            st.Page("ideagenerator.py", title="Innovative Solution Generator"),
+            st.Page("compt.py", title="Competitor Analysis"),
+            st.Page("lean.py", title="Startup Idea Validator"),
+        ],
+        "Operations": [
+            st.Page("history.py", title="Analysis History"),
+            st.Page("admin.py", title="LLM Call Metrics"),
+        ],
+    }
+    pipeline.mode_toggle()
+    st.navigation(pages).run()
+
+if __name__ == "__main__":
+    main()
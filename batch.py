@@ -0,0 +1,137 @@
+import argparse
+import importlib
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+import problem_analysis
+from scoring import parse_score, strip_scores
+
+# Headless batch runner for the problem-analysis pipeline (transformer.py / proban.py).
+# Reads problem/barrier/affected/wish rows from CSV or JSONL, analyses them with bounded parallelism and
+# appends each finished row to a JSONL file. Rows already in the output are skipped, so an interrupted run
+# resumes where it stopped.
+#
+#   python batch.py problems.csv results.jsonl --app proban --workers 4 [--parquet results.parquet]
+
+INPUT_FIELDS = ["problem", "barrier", "affected", "wish"]
+OUTPUT_FIELDS = ["problem_summary", "empirical_evidence", "potential_analysis", "challenges_analysis"]
+CHUNK_SIZE = 500  # Input rows read into memory at a time
+
+
+# Function to read the input file in chunks and yield (row id, row dict); the id column is used when present
+def read_rows(path):
+    if path.endswith((".jsonl", ".json")):
+        chunks = pd.read_json(path, lines=True, chunksize=CHUNK_SIZE, dtype=False)
+    else:
+        chunks = pd.read_csv(path, chunksize=CHUNK_SIZE, dtype=str, keep_default_na=False)
+    for chunk in chunks:
+        missing = [field for field in INPUT_FIELDS if field not in chunk.columns]
+        if missing:
+            raise ValueError(f"Input is missing the column(s): {', '.join(missing)}")
+        for index, row in chunk.iterrows():
+            row_id = str(row["id"]) if "id" in chunk.columns else str(index)
+            yield row_id, {field: str(row[field]) for field in INPUT_FIELDS}
+
+
+# Function to collect the ids of rows already written to the output (the checkpoint)
+def completed_ids(path):
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(str(json.loads(line)["id"]))
+            except (ValueError, KeyError):
+                continue  # A line cut off by an interrupted run; that row is analysed again
+    return done
+
+
+# Function to end a line left half-written by an interrupted run, so new records start on their own line
+def terminate_partial_line(path):
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+
+# Function to analyse one row with the chosen app's analysis tasks; the score lines become numeric fields
+def analyse_row(analysis_tasks, app, row_id, row):
+    tasks = analysis_tasks(row["problem"], row["barrier"], row["affected"], row["wish"])
+    results = dict(zip(OUTPUT_FIELDS, problem_analysis.agent_interactions(app, tasks)))
+    scores = {
+        "potential_score": parse_score(results["potential_analysis"], "potential"),
+        "challenge_score": parse_score(results["challenges_analysis"], "challenge"),
+    }
+    models = {"models": [text.model for text in results.values()]}  # Which model answered each analysis
+    return {"id": row_id, "app": app, **row, **{field: strip_scores(text) for field, text in results.items()}, **scores, **models}
+
+
+def run(input_path, output_path, app, workers):
+    analysis_tasks = importlib.import_module(app).analysis_tasks
+    done = completed_ids(output_path)
+    processed = failed = 0
+    pending = {}
+
+    terminate_partial_line(output_path)
+
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as executor:
+
+        def collect(futures):
+            nonlocal processed, failed
+            for future in futures:
+                row_id = pending.pop(future)
+                try:
+                    record = future.result()
+                except Exception as e:
+                    # Failed rows are not checkpointed, so the next run retries them
+                    failed += 1
+                    print(f"Row {row_id} failed: {e}", file=sys.stderr)
+                    continue
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                processed += 1
+                print(f"Row {row_id} done ({processed} processed, {failed} failed)", file=sys.stderr)
+
+        # Keep at most two rows per worker queued so memory stays bounded on large inputs
+        for row_id, row in read_rows(input_path):
+            if row_id in done:
+                continue
+            done.add(row_id)
+            pending[executor.submit(analyse_row, analysis_tasks, app, row_id, row)] = row_id
+            if len(pending) >= 2 * workers:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+        collect(list(pending))
+
+    return processed, failed
+
+
+# Function to convert the finished JSONL output into a Parquet file (requires pyarrow or fastparquet)
+def export_parquet(jsonl_path, parquet_path):
+    pd.read_json(jsonl_path, lines=True, dtype=False).to_parquet(parquet_path, index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the problem-analysis pipeline over a CSV or JSONL file.")
+    parser.add_argument("input", help="CSV or JSONL file with problem, barrier, affected and wish columns (optional id)")
+    parser.add_argument("output", help="JSONL file the results are appended to; also the resume checkpoint")
+    parser.add_argument("--app", choices=["transformer", "proban"], default="proban", help="Which app's prompts and model to use")
+    parser.add_argument("--workers", type=int, default=4, help="Rows analysed in parallel")
+    parser.add_argument("--parquet", help="Also export all results to this Parquet file when the run finishes")
+    args = parser.parse_args(argv)
+
+    processed, failed = run(args.input, args.output, args.app, max(1, args.workers))
+    if args.parquet:
+        export_parquet(args.output, args.parquet)
+    print(f"Finished: {processed} rows processed, {failed} failed.", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+# Latency benchmark for the apps' LLM pipelines, run against the local mock API (mock_openai.py).
+# Every scenario drives the same entry points the pages use; N simulated sessions run concurrently and the
+# report lists per-stage and end-to-end p50/p95 latency plus throughput.
+#
+#   python benchmark.py --sessions 8 --iterations 3 --latency lognormal:1.0:0.4 --rate-limit 0.05
+#   python benchmark.py --scenario lean --stream --json results.json
+#   python benchmark.py --scenario compt --hedge --latency lognormal:0.5:0.8   (tail latency with hedging)
+#   python benchmark.py --scenario proban --fail-model gpt-4-turbo --error-rate 0.1   (retries, circuit breaker, fallback)
+#   python benchmark.py --startup   (page script execution time on first load and per rerun)
+#   python benchmark.py --scenario proban --stream --record run.jsonl   then   --replay run.jsonl [--replay-speed 1]
+#   (replay serves the recorded responses without the mock API, to measure post-processing apart from upstream latency)
+
+SCENARIOS = ["transformer", "proban", "lean", "compt", "ideas"]
+APP_SCRIPTS = ["app.py", "transformer.py", "proban.py", "lean.py", "compt.py", "ideagenerator.py", "admin.py"]
+# Imports that should only be paid for by the pages and interactions that need them
+HEAVY_MODULES = ["openai", "pandas", "spacy", "bs4"]
+
+
+# Inputs for one simulated run; the tag keeps runs distinct so caching and coalescing do not hide upstream latency
+def sample_inputs(tag):
+    return {
+        "problem": f"[{tag}] In steel and automotive plants, high noise levels and extreme heat create a harsh work environment.",
+        "barrier": "Worker fatigue, safety incidents, lower productivity, hearing loss and heat-related illnesses.",
+        "affected": "Production workers, machine operators, maintenance staff, supervisors and safety personnel.",
+        "wish": "Protective measures are costly, PPE is uncomfortable, and regulation and budgets constrain solutions.",
+        "solution": f"[{tag}] A cooling, noise-cancelling smart helmet with heat-stress monitoring.",
+    }
+
+
+# Stand-in for st.empty() that records when the first streamed token reaches the page
+class TimingPlaceholder:
+    def __init__(self):
+        self.first_token = None
+
+    def markdown(self, text):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+
+    write = markdown
+
+
+# Function to time one call of a single-completion entry point and record its latency (and time to first token)
+def timed_stage(record, stage, stream, fn, *args):
+    placeholder = TimingPlaceholder() if stream else None
+    start = time.perf_counter()
+    result = fn(*args, placeholder=placeholder) if stream else fn(*args)
+    record(stage, time.perf_counter() - start)
+    if stream and placeholder.first_token is not None:
+        record(stage + ".ttft", placeholder.first_token - start)
+    return result
+
+
+def run_analysis(app, record, inputs, stream):
+    problem_analysis = importlib.import_module("problem_analysis")
+    tasks = importlib.import_module(app).analysis_tasks(inputs["problem"], inputs["barrier"], inputs["affected"], inputs["wish"])
+    start = time.perf_counter()
+    first_token = set()
+    for index, text, done in problem_analysis.agent_interactions_as_completed(app, tasks, stream=stream):
+        stage = problem_analysis.ANALYSIS_STAGES[index]
+        if stream and index not in first_token:
+            first_token.add(index)
+            record(f"{app}.{stage}.ttft", time.perf_counter() - start)
+        if done:
+            record(f"{app}.{stage}", time.perf_counter() - start)
+
+
+def run_lean(record, inputs, stream):
+    lean = importlib.import_module("lean")
+    segments = inputs["affected"]
+    hypotheses = timed_stage(record, "lean.hypotheses", stream, lean.generate_text,
+                             lean.build_hypotheses_prompt(inputs["problem"], inputs["solution"], segments))
+    mvp = timed_stage(record, "lean.mvp", stream, lean.generate_text,
+                      lean.build_mvp_prompt(inputs["problem"], inputs["solution"], segments))
+    timed_stage(record, "lean.testing", stream, lean.generate_text, lean.build_testing_prompt(hypotheses, mvp))
+
+
+def run_compt(record, inputs, stream):
+    compt = importlib.import_module("compt")
+    timed_stage(record, "compt.competitors", stream, compt.get_competitors, inputs["solution"])
+    timed_stage(record, "compt.features", stream, compt.analyze_features, inputs["solution"])
+    timed_stage(record, "compt.hypotheses", stream, compt.analyze_hypotheses, inputs["solution"])
+
+
+def run_ideas(record, inputs, stream):
+    ideagenerator = importlib.import_module("ideagenerator")
+    timed_stage(record, "ideas.solutions", stream, ideagenerator.generate_innovative_solutions, inputs["problem"], inputs["affected"])
+
+
+RUNNERS = {
+    "transformer": lambda record, inputs, stream: run_analysis("transformer", record, inputs, stream),
+    "proban": lambda record, inputs, stream: run_analysis("proban", record, inputs, stream),
+    "lean": run_lean,
+    "compt": run_compt,
+    "ideas": run_ideas,
+}
+
+
+# Function to compute a percentile (nearest rank) of a list of samples
+def percentile(samples, q):
+    ordered = sorted(samples)
+    if not ordered:
+        return float("nan")
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100.0 * len(ordered) + 0.5)) - 1))]
+
+
+# Function to tag a run; recorded and replayed runs need the same inputs on both sides, so they are not timestamped
+def run_tag(scenario, session_id, iteration):
+    tag = f"{scenario}-{session_id}-{iteration}"
+    return tag if os.environ.get("LLM_CASSETTE_MODE") in ("record", "replay") else f"{tag}-{time.time_ns()}"
+
+
+# Function to run one scenario with N concurrent sessions and return its latency samples and throughput
+def run_scenario(scenario, sessions, iterations, stream, same_input):
+    samples = defaultdict(list)
+    errors = []
+    lock = threading.Lock()
+
+    def record(stage, seconds):
+        with lock:
+            samples[stage].append(seconds)
+
+    def session(session_id):
+        for iteration in range(iterations):
+            inputs = sample_inputs("shared" if same_input else run_tag(scenario, session_id, iteration))
+            start = time.perf_counter()
+            try:
+                RUNNERS[scenario](record, inputs, stream)
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+                continue
+            record(f"{scenario}.end_to_end", time.perf_counter() - start)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(session_id,)) for session_id in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    completed = len(samples[f"{scenario}.end_to_end"])
+    return {
+        "scenario": scenario,
+        "sessions": sessions,
+        "completed_runs": completed,
+        "errors": errors,
+        "wall_seconds": elapsed,
+        "runs_per_second": completed / elapsed if elapsed else 0.0,
+        "stages": {
+            stage: {"count": len(values), "p50_ms": percentile(values, 50) * 1000, "p95_ms": percentile(values, 95) * 1000}
+            for stage, values in sorted(samples.items())
+        },
+    }
+
+
+def print_report(result):
+    print(f"\n== {result['scenario']}: {result['sessions']} sessions, {result['completed_runs']} runs in "
+          f"{result['wall_seconds']:.2f}s ({result['runs_per_second']:.2f} runs/s), {len(result['errors'])} errors")
+    print(f"{'stage':<34}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}")
+    for stage, stats in result["stages"].items():
+        print(f"{stage:<34}{stats['count']:>6}{stats['p50_ms']:>10.0f}{stats['p95_ms']:>10.0f}")
+    for error in result["errors"][:5]:
+        print(f"  error: {error}")
+
+
+# Function (run in a fresh interpreter) to time a page script's first execution and its reruns without any interaction
+def measure_startup(script, reruns):
+    from streamlit.testing.v1 import AppTest
+
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), script)
+    started = time.perf_counter()
+    app = AppTest.from_file(path, default_timeout=120)
+    app.run()
+    first_run = time.perf_counter() - started
+    samples = []
+    for _ in range(reruns):
+        started = time.perf_counter()
+        app.run()
+        samples.append(time.perf_counter() - started)
+    return {
+        "script": script,
+        "first_run_ms": first_run * 1000,
+        "rerun_p50_ms": percentile(samples, 50) * 1000,
+        "rerun_p95_ms": percentile(samples, 95) * 1000,
+        "heavy_modules_loaded": [name for name in HEAVY_MODULES if name in sys.modules],
+    }
+
+
+# Function to measure every page in its own interpreter, so each first run pays the imports like a fresh container
+def run_startup(reruns):
+    results = []
+    print(f"{'script':<20}{'first run ms':>14}{'rerun p50 ms':>14}{'rerun p95 ms':>14}  heavy modules loaded")
+    for script in APP_SCRIPTS:
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--startup-child", script, "--reruns", str(reruns)],
+            capture_output=True, text=True,
+        )
+        if child.returncode != 0:
+            print(f"{script:<20} failed: {child.stderr.strip().splitlines()[-1:]}")
+            continue
+        result = json.loads(child.stdout.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{script:<20}{result['first_run_ms']:>14.0f}{result['rerun_p50_ms']:>14.1f}{result['rerun_p95_ms']:>14.1f}  "
+              f"{', '.join(result['heavy_modules_loaded']) or '-'}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the apps' LLM pipelines against the local mock API.")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="Scenario to run (repeatable; default all)")
+    parser.add_argument("--sessions", type=int, default=4, help="Concurrent simulated sessions")
+    parser.add_argument("--iterations", type=int, default=2, help="Runs per session")
+    parser.add_argument("--stream", action="store_true", help="Use the streaming path and report time to first token")
+    parser.add_argument("--same-input", action="store_true", help="Send identical inputs from every session (exercises coalescing)")
+    parser.add_argument("--cache", action="store_true", help="Keep the on-disk response cache enabled")
+    parser.add_argument("--hedge", action="store_true", help="Hedge calls slower than their stage's p90 (time to first token when streamed)")
+    parser.add_argument("--api-base", help="Use an already running mock server instead of starting one")
+    parser.add_argument("--latency", default="lognormal:0.5:0.3", help="Mock latency distribution (see mock_openai.py)")
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--reply-tokens", type=int, default=100)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Share of mock requests answered with a 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of mock requests answered with a 503")
+    parser.add_argument("--fail-model", action="append", default=[], help="Mock model whose requests all fail with a 503 (repeatable)")
+    parser.add_argument("--record", metavar="CASSETTE", help="Record the API traffic to this cassette file (see cassette.py)")
+    parser.add_argument("--replay", metavar="CASSETTE", help="Answer every request from this cassette file instead of the mock API")
+    parser.add_argument("--replay-speed", type=float, default=0.0, help="0 replays instantly, 1 at the recorded timing")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    parser.add_argument("--startup", action="store_true", help="Measure page script execution time instead of LLM latency")
+    parser.add_argument("--reruns", type=int, default=20, help="Reruns per page for --startup")
+    parser.add_argument("--startup-child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.startup_child:
+        print(json.dumps(measure_startup(args.startup_child, max(1, args.reruns))))
+        return 0
+    if args.startup:
+        results = run_startup(max(1, args.reruns))
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+        return 0 if len(results) == len(APP_SCRIPTS) else 1
+
+    # Configure before the apps import the shared client
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    if not args.cache:
+        os.environ["LLM_CACHE_ENABLED"] = "0"
+    if args.hedge:
+        os.environ["LLM_HEDGE"] = "1"
+    if args.record or args.replay:
+        os.environ["LLM_CASSETTE_MODE"] = "replay" if args.replay else "record"
+        os.environ["LLM_CASSETTE"] = args.replay or args.record
+        os.environ["LLM_CASSETTE_SPEED"] = str(args.replay_speed)
+
+    import openai
+    import mock_openai
+
+    settings = None
+    api_base = args.api_base
+    if api_base is None and not args.replay:
+        settings = mock_openai.MockSettings(args.latency, args.token_delay, args.reply_tokens, args.rate_limit, 0.2, args.error_rate, args.fail_model)
+        _, api_base = mock_openai.start_server(settings)
+    if api_base is not None:
+        openai.api_base = api_base
+
+    results = []
+    for scenario in args.scenario or SCENARIOS:
+        result = run_scenario(scenario, max(1, args.sessions), max(1, args.iterations), args.stream, args.same_input)
+        print_report(result)
+        results.append(result)
+    if settings is not None:
+        print(f"\nMock API: {settings.requests} requests, {settings.rate_limited} answered with 429, {settings.errors} with 503")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 1 if any(result["errors"] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+import time
+
+import llm_cache
+
+# Record and replay of the raw API traffic, below caching, coalescing, rate limiting and retries. In record mode
+# every successful request is appended to a cassette file (JSON lines) together with its response: the full
+# response, or every streamed chunk with its offset from the start of the request. In replay mode requests are
+# answered from the cassette without any network access, either instantly or at the recorded speed, so a page's
+# rendering and post-processing can be profiled apart from upstream latency and demos and tests run
+# deterministically. A request that was recorded several times is answered with its recordings in turn.
+#
+#   LLM_CASSETTE_MODE=record LLM_CASSETTE=demo.jsonl streamlit run app.py
+#   LLM_CASSETTE_MODE=replay LLM_CASSETTE=demo.jsonl LLM_CACHE_ENABLED=0 streamlit run app.py
+
+CASSETTE_MODE = os.environ.get("LLM_CASSETTE_MODE", "off")  # "off", "record" or "replay"
+CASSETTE_PATH = os.environ.get("LLM_CASSETTE", os.path.join(".cache", "cassette.jsonl"))
+# Replay speed: 0 answers instantly, 1 at the recorded latency and token timing, 2 takes twice as long
+CASSETTE_SPEED = float(os.environ.get("LLM_CASSETTE_SPEED", "0"))
+
+
+# Raised in replay mode for a request that is not on the cassette
+class CassetteMiss(LookupError):
+    pass
+
+
+class Cassette:
+    def __init__(self, path=CASSETTE_PATH, speed=CASSETTE_SPEED):
+        self.path = path
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._entries = None  # key -> recorded interactions, loaded on the first replay
+        self._played = {}  # key -> interactions replayed so far
+
+    # Append one interaction to the cassette; one write per line, so concurrent writers do not interleave
+    def _append(self, entry):
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "ab") as f:
+                f.write(line)
+
+    # Send a request through send (openai.ChatCompletion.create) and record what comes back
+    def record(self, send, request):
+        started = time.monotonic()
+        entry = {"key": _key(request), "request": _recorded_request(request), "stream": bool(request.get("stream")), "recorded": time.time()}
+        response = send(**request)
+        if not request.get("stream"):
+            entry["latency"] = time.monotonic() - started
+            entry["response"] = response.to_dict_recursive()
+            self._append(entry)
+            return response
+        return self._record_stream(entry, response, started)
+
+    def _record_stream(self, entry, chunks, started):
+        recorded = []
+        try:
+            for chunk in chunks:
+                recorded.append([time.monotonic() - started, chunk.to_dict_recursive()])
+                yield chunk
+        finally:
+            chunks.close()
+        # Only complete streams are kept; a cancelled one would replay as a truncated answer
+        entry["chunks"] = recorded
+        self._append(entry)
+
+    def _load(self):
+        entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if line.endswith(b"\n"):
+                        entry = json.loads(line)
+                        entries.setdefault(entry["key"], []).append(entry)
+        return entries
+
+    # Answer a request from the cassette, in the form it asks for (a response, or a stream of chunks)
+    def replay(self, request):
+        key = _key(request)
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load()
+            recordings = self._entries.get(key)
+            if not recordings:
+                content = (request["messages"][-1].get("content") or "").strip()
+                raise CassetteMiss(f"No recording of this {request['model']} request in {self.path}: {content[:80]!r}")
+            played = self._played.get(key, 0)
+            self._played[key] = played + 1
+        entry = recordings[played % len(recordings)]
+        chunks = entry["chunks"] if "chunks" in entry else _as_chunks(entry)
+        if request.get("stream"):
+            return self._replay_stream(chunks)
+        self._wait(time.monotonic(), entry.get("latency") or (chunks[-1][0] if chunks else 0.0))
+        return _construct(entry.get("response") or _as_response(chunks))
+
+    def _replay_stream(self, chunks):
+        started = time.monotonic()
+        for offset, chunk in chunks:
+            self._wait(started, offset)
+            yield _construct(chunk)
+
+    def _wait(self, started, offset):
+        delay = started + offset * self.speed - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+# Function to identify a request: everything that determines the response (see llm_cache.cache_key)
+def _key(request):
+    return llm_cache.cache_key(request)
+
+
+# Function to keep the readable part of a request in the cassette (no transport options)
+def _recorded_request(request):
+    return {name: value for name, value in request.items() if name not in llm_cache.TRANSPORT_PARAMS}
+
+
+def _construct(payload):
+    import openai
+
+    return openai.openai_object.OpenAIObject.construct_from(payload)
+
+
+# Function to serve a recorded full response to a streaming request, as a single content chunk
+def _as_chunks(entry):
+    response = entry["response"]
+    content = response["choices"][0]["message"].get("content") or ""
+    chunk = {key: response[key] for key in ("id", "created", "model") if key in response}
+    chunk.update({"object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": "stop"}]})
+    return [[entry.get("latency") or 0.0, chunk]]
+
+
+# Function to serve a recorded stream to a non-streaming request, as one response with the joined content
+def _as_response(chunks):
+    content = "".join(chunk["choices"][0]["delta"].get("content") or "" for _, chunk in chunks if chunk.get("choices"))
+    first = chunks[0][1] if chunks else {}
+    response = {key: first[key] for key in ("id", "created", "model") if key in first}
+    response.update({"object": "chat.completion", "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}]})
+    return response
+
+
+_cassette_lock = threading.Lock()
+_cassette = None
+
+
+# Function to get the process-wide cassette, or None when record/replay is off
+def get_cassette():
+    global _cassette
+    if CASSETTE_MODE not in ("record", "replay"):
+        return None
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette()
+        return _cassette
+
+
+# Function to send a request to the API (send is openai.ChatCompletion.create), recording or replaying it per LLM_CASSETTE_MODE
+def create(send, **request):
+    cassette = get_cassette()
+    if cassette is None:
+        return send(**request)
+    if CASSETTE_MODE == "replay":
+        return cassette.replay(request)
+    return cassette.record(send, request)
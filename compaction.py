@@ -0,0 +1,54 @@
+import re
+
+from rate_limiter import approximate_tokens
+
+# Context compaction for chained stages. An upstream answer is reduced to its essential bullet items (each cut to
+# its first sentence, headings kept for structure) and to a token budget before it is passed into a downstream
+# prompt. This is extractive and runs locally, so it costs no API call and always gives the same output for the
+# same answer, which keeps downstream prompts cacheable.
+
+_ITEM = re.compile(r"^\s*(?:[-*+•]|\d{1,2}[.)]|[a-zA-Z][.)])\s+(?P<text>.*\S)")
+_HEADING = re.compile(r"^\s*(?:#{1,6}\s+.*\S|\S.{0,78}:)\s*$")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[A-Z0-9])")
+_MARKUP = re.compile(r"[*_`#]+")
+
+
+def _clean(text):
+    return " ".join(_MARKUP.sub("", text).split())
+
+
+def _first_sentence(text):
+    return _SENTENCE_END.split(text, 1)[0]
+
+
+# Function to extract the essential lines of an answer: ("heading", text) and ("item", text) pairs in order.
+# Answers without any list items fall back to the first sentence of each paragraph.
+def extract_items(text):
+    lines = (text or "").splitlines()
+    items = []
+    for line in lines:
+        match = _ITEM.match(line)
+        if match:
+            items.append(("item", _clean(_first_sentence(match.group("text")))))
+        elif _HEADING.match(line) or _HEADING.match(_MARKUP.sub("", line)):
+            items.append(("heading", _clean(line).rstrip(":") + ":"))
+    if any(kind == "item" for kind, _ in items):
+        return [(kind, text) for kind, text in items if text and text != ":"]
+    paragraphs = re.split(r"\n\s*\n", text or "")
+    return [("item", _clean(_first_sentence(paragraph.strip()))) for paragraph in paragraphs if paragraph.strip()]
+
+
+# Function to compact an answer to bullet items within max_tokens (approximate); headings without items are dropped
+def compact(text, max_tokens):
+    kept = []
+    used = 0
+    for kind, item in extract_items(text):
+        line = item if kind == "heading" else "- " + item
+        tokens = approximate_tokens(line) + 1
+        if used + tokens > max_tokens:
+            break
+        kept.append((kind, line))
+        used += tokens
+    while kept and kept[-1][0] == "heading":
+        kept.pop()
+    return "\n".join(line for _, line in kept)
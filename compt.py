@@ -1,11 +1,30 @@
 import streamlit as st
-import openai
 
-# Set the OpenAI API key
-openai.api_key = st.secrets["openai"]["openai_api_key"]
+import jobs
+import link_checker
+import llm_client
+import pipeline
 
-# Function to retrieve competitors using OpenAI
-def get_competitors(solution_description):
+# Outputs of a competitor analysis job and their subheaders
+SECTIONS = [
+    ("competitors", "1. Competitor Analysis"),
+    ("features", "2. Key Features Resonating in the Market"),
+    ("hypotheses", "3. Key Hypotheses to Test"),
+]
+
+# Function to run one market-analyst prompt (the model is routed per stage); with a placeholder the answer is streamed into the page
+def ask_market_analyst(prompt, placeholder=None, stage=None):
+    messages = [
+        {"role": "system", "content": "You are a market analyst."},
+        {"role": "user", "content": prompt}
+    ]
+    params = dict(max_tokens=1000, n=1, temperature=0.7, app="compt", stage=stage)
+    if placeholder is not None:
+        return llm_client.complete_into(placeholder, messages, **params)
+    return llm_client.complete(messages, **params)
+
+# Function to retrieve competitors using OpenAI; with a placeholder the answer is streamed into the page
+def get_competitors(solution_description, placeholder=None):
     prompt = f"""
     Based on the following solution description:
     "{solution_description}"
@@ -15,88 +34,70 @@ def get_competitors(solution_description):
     - A brief description of their products/services
     - If possible, provide a few links to articles, blog posts, or resources where these competitors are discussed or reviewed.
     """
-    response = openai.ChatCompletion.create(
-        model="gpt-4-turbo",
-        messages=[
-            {"role": "system", "content": "You are a market analyst."},
-            {"role": "user", "content": prompt}
-        ],
-        max_tokens=1000,
-        n=1,
-        temperature=0.7,
-    )
-    
-    competitors = response.choices[0].message['content'].strip()
-    return competitors
+    return ask_market_analyst(prompt, placeholder, "competitors")
 
-# Function to analyze the most important features
-def analyze_features(solution_description):
+# Function to analyze the most important features; with a placeholder the answer is streamed into the page
+def analyze_features(solution_description, placeholder=None):
     prompt = f"""
     Based on the companies offering similar solutions to the following description:
     "{solution_description}"
     
     Which features of competitors seem to resonate most in the market and with paying users? Please provide a list of features with a short description of why they are so important and beneficial. Add any relevant sources if possible.
     """
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You are a market analyst."},
-            {"role": "user", "content": prompt}
-        ],
-        max_tokens=1000,
-        n=1,
-        temperature=0.7,
-    )
-    
-    features = response.choices[0].message['content'].strip()
-    return features
+    return ask_market_analyst(prompt, placeholder, "features")
 
-# Function to analyze key hypotheses
-def analyze_hypotheses(solution_description):
+# Function to analyze key hypotheses; with a placeholder the answer is streamed into the page
+def analyze_hypotheses(solution_description, placeholder=None):
     prompt = f"""
     Based on the companies offering similar solutions to the following description:
     "{solution_description}"
     
     Which key hypotheses need to be tested to ensure that the product meets the needs and solves the problem? Please provide a list of hypotheses with a short description of what needs to be tested because it is an open question or uncertainty.
     """
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You are a market analyst."},
-            {"role": "user", "content": prompt}
-        ],
-        max_tokens=1000,
-        n=1,
-        temperature=0.7,
-    )
-    
-    hypotheses = response.choices[0].message['content'].strip()
-    return hypotheses
+    return ask_market_analyst(prompt, placeholder, "hypotheses")
+
+# Function to run the three analyses as a background job (see jobs.py)
+def run_job(params, progress):
+    solution_description = params["solution_description"]
+    competitors = get_competitors(solution_description, placeholder=progress.placeholder("competitors"))
+    progress.finish("competitors", competitors)
+
+    # The links in the competitor analysis are verified while the features are analysed, then marked live or dead
+    links = link_checker.check_text_async(competitors)
+    progress.check()
+    progress.finish("features", analyze_features(solution_description, placeholder=progress.placeholder("features")))
+    progress.check()
+    annotated = link_checker.annotate(competitors, links.result())
+    progress.finish("competitors", llm_client.Completion(annotated, getattr(competitors, "model", None)))
+
+    progress.check()
+    progress.finish("hypotheses", analyze_hypotheses(solution_description, placeholder=progress.placeholder("hypotheses")))
 
 # Streamlit App
-st.title("Simplified Competitor Analysis Tool")
-
-# Step 1: Input Solution Description
-solution_description = st.text_area(
-    "Describe the solution you are working on:",
-    placeholder="Enter a detailed description of your product or service idea..."
-)
-
-if st.button("Analyze Solution"):
-    if solution_description:
-        # Step 2: Get Competitors
-        st.subheader("1. Competitor Analysis")
-        competitors = get_competitors(solution_description)
-        st.write(competitors)
-        
-        # Step 3: Analyze Features
-        st.subheader("2. Key Features Resonating in the Market")
-        features = analyze_features(solution_description)
-        st.write(features)
-        
-        # Step 4: Analyze Key Hypotheses
-        st.subheader("3. Key Hypotheses to Test")
-        hypotheses = analyze_hypotheses(solution_description)
-        st.write(hypotheses)
-    else:
-        st.warning("Please enter a solution description to proceed.")
+def main():
+    jobs.register("compt", run_job)
+
+    st.title("Simplified Competitor Analysis Tool")
+
+    # Step 1: Input Solution Description
+    solution_description = st.text_area(
+        "Describe the solution you are working on:",
+        pipeline.value("solution"),
+        placeholder="Enter a detailed description of your product or service idea..."
+    )
+
+    # Steps 2-4 (competitors, features, hypotheses) run in a background job that survives reruns and reconnects
+    if st.button("Analyze Solution"):
+        if solution_description:
+            jobs.start("compt_job", "compt", {"solution_description": solution_description})
+        else:
+            st.warning("Please enter a solution description to proceed.")
+
+    job = jobs.show(jobs.tracked("compt_job"), SECTIONS)
+
+    # Pipeline mode: the solution goes on to the idea validator, whose stages start right away
+    if job is not None and job["status"] == "done":
+        pipeline.advance("compt", solution=job["params"]["solution_description"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import streamlit as st
+
+from scoring import SCORE_INSTRUCTIONS, parse_score, strip_scores
+
+# Local history of every completed analysis, kept across sessions and server restarts. One SQLite file holds a
+# small metadata row per analysis (app, title, time, models, scores) and, in a separate table, the zlib-compressed
+# inputs and outputs, which are only read when an entry is opened. A contentless FTS5 index over the titles and
+# texts makes the history searchable without storing the texts twice. Pages are read by keyset (id < cursor) on the
+# primary key, so opening or paging the history costs the same with a hundred entries or with tens of thousands.
+# Recording the same inputs and outputs twice (a rerun answered from the cache, say) keeps a single entry.
+
+HISTORY_ENABLED = os.environ.get("HISTORY_ENABLED", "1") != "0"
+HISTORY_PATH = os.environ.get("HISTORY_PATH", os.path.join(".cache", "history.sqlite"))
+PAGE_SIZE = 50  # Entries per history page
+
+# Input field that titles an entry, per app
+TITLE_FIELDS = {
+    "transformer": "problem",
+    "proban": "problem",
+    "ideas": "problem_description",
+    "compt": "solution_description",
+    "lean": "problem_description",
+}
+APP_NAMES = {
+    "transformer": "Trend to Opportunity Transformer",
+    "proban": "Problem Analyser",
+    "ideas": "Innovative Solution Generator",
+    "compt": "Competitor Analysis",
+    "lean": "Startup Idea Validator",
+}
+
+
+class HistoryStore:
+    def __init__(self, path=HISTORY_PATH):
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            "id INTEGER PRIMARY KEY, key TEXT NOT NULL UNIQUE, app TEXT NOT NULL, title TEXT NOT NULL, "
+            "created REAL NOT NULL, models TEXT NOT NULL, scores TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS analyses_app ON analyses (app, id)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS texts (id INTEGER PRIMARY KEY, data BLOB NOT NULL)")
+        try:
+            self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS analyses_fts USING fts5(title, body, content='')")
+            self.searchable = True
+        except sqlite3.OperationalError:
+            self.searchable = False  # SQLite built without FTS5: search falls back to the titles
+
+    # Record a completed analysis; returns its id (the existing one if the same analysis is already stored)
+    def add(self, app, inputs, outputs, models=None, scores=None):
+        inputs = {name: str(text) for name, text in inputs.items()}
+        outputs = {name: str(text) for name, text in outputs.items() if text is not None}
+        content = json.dumps({"app": app, "inputs": inputs, "outputs": outputs}, sort_keys=True, ensure_ascii=False)
+        key = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        title = " ".join(str(inputs.get(TITLE_FIELDS.get(app)) or next(iter(inputs.values()), "")).split())[:200]
+        body = "\n".join(list(inputs.values()) + [strip_scores(text) for text in outputs.values()])
+        data = zlib.compress(json.dumps({"inputs": inputs, "outputs": outputs}, ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            row = self._db.execute("SELECT id FROM analyses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                return row[0]
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                entry_id = self._db.execute(
+                    "INSERT INTO analyses (key, app, title, created, models, scores) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, app, title, time.time(), json.dumps(models or {}), json.dumps(scores or {})),
+                ).lastrowid
+                self._db.execute("INSERT INTO texts (id, data) VALUES (?, ?)", (entry_id, data))
+                if self.searchable:
+                    self._db.execute("INSERT INTO analyses_fts (rowid, title, body) VALUES (?, ?, ?)", (entry_id, title, body))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return entry_id
+
+    # Return one page of entry metadata, newest first, older than the cursor (an id) when one is given.
+    # query is a free-text search; every word must appear (as a prefix) in the title, inputs or outputs.
+    def page(self, app=None, query=None, before=None, limit=PAGE_SIZE):
+        where, args = [], []
+        if app:
+            where.append("app = ?")
+            args.append(app)
+        if before is not None:
+            where.append("id < ?")
+            args.append(before)
+        words = (query or "").split()
+        if words and self.searchable:
+            where.append("id IN (SELECT rowid FROM analyses_fts WHERE analyses_fts MATCH ?)")
+            args.append(" ".join('"' + word.replace('"', '""') + '"*' for word in words))
+        elif words:
+            for word in words:
+                where.append("title LIKE ?")
+                args.append(f"%{word}%")
+        sql = "SELECT id, app, title, created, models, scores FROM analyses"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id DESC LIMIT ?"
+        with self._lock:
+            rows = self._db.execute(sql, (*args, limit)).fetchall()
+        entries = [dict(zip(("id", "app", "title", "created", "models", "scores"), row)) for row in rows]
+        for entry in entries:
+            entry["models"] = json.loads(entry["models"])
+            entry["scores"] = json.loads(entry["scores"])
+        return entries
+
+    # Return the inputs and outputs of an entry, or None for an unknown id
+    def load(self, entry_id):
+        with self._lock:
+            row = self._db.execute("SELECT data FROM texts WHERE id = ?", (entry_id,)).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+
+_store_lock = threading.Lock()
+_store = None
+
+
+# Function to get the process-wide history store, or None when the history is disabled
+def get_store():
+    global _store
+    if not HISTORY_ENABLED:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore()
+        return _store
+
+
+# Function to record a completed analysis (models maps output keys to the model that answered them).
+# Scores are read from the outputs that carry a score line.
+def record(app, inputs, outputs, models=None):
+    store = get_store()
+    if store is None:
+        return None
+    scores = {}
+    for name in SCORE_INSTRUCTIONS:
+        for text in outputs.values():
+            score = parse_score(text, name)
+            if score is not None:
+                scores[name] = score
+    return store.add(app, inputs, outputs, models, scores)
+
+
+# Streamlit App
+def main():
+    st.title("Analysis History")
+
+    store = get_store()
+    if store is None:
+        st.info("The analysis history is switched off (HISTORY_ENABLED=0).")
+        return
+
+    columns = st.columns([3, 2])
+    query = columns[0].text_input("Search", placeholder="Words from the problem, solution or results")
+    app = columns[1].selectbox("Tool", [None] + list(APP_NAMES), format_func=lambda name: APP_NAMES.get(name, "All tools"))
+
+    # Keyset paging: the cursors of the pages before the current one are kept, so "Newer" goes back without an offset
+    filters = (query, app)
+    if st.session_state.get("history_filters") != filters:
+        st.session_state.history_filters = filters
+        st.session_state.history_cursors = [None]
+    cursors = st.session_state.history_cursors
+    entries = store.page(app, query, cursors[-1], PAGE_SIZE + 1)
+    has_older = len(entries) > PAGE_SIZE
+    entries = entries[:PAGE_SIZE]
+    if not entries:
+        st.info("No analyses found." if query or app else "No analyses have been recorded yet.")
+        return
+
+    rows = [
+        {
+            "time": datetime.fromtimestamp(entry["created"]).strftime("%Y-%m-%d %H:%M"),
+            "tool": APP_NAMES.get(entry["app"], entry["app"]),
+            "title": entry["title"],
+            "models": ", ".join(sorted({model for model in entry["models"].values() if model})),
+            **{f"{name}_score": entry["scores"].get(name) for name in SCORE_INSTRUCTIONS},
+        }
+        for entry in entries
+    ]
+    selection = st.dataframe(rows, hide_index=True, on_select="rerun", selection_mode="single-row", key=f"history_{len(cursors)}")
+
+    buttons = st.columns(2)
+    if buttons[0].button("Newer", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    if buttons[1].button("Older", disabled=not has_older):
+        cursors.append(entries[-1]["id"])
+        st.rerun()
+
+    # Only the selected entry's texts are read and decompressed
+    selected = selection.selection.rows
+    if selected:
+        entry = entries[selected[0]]
+        texts = store.load(entry["id"])
+        st.header(entry["title"])
+        st.caption(f"{APP_NAMES.get(entry['app'], entry['app'])}, {rows[selected[0]]['time']}")
+        with st.expander("Inputs", expanded=False):
+            for name, text in texts["inputs"].items():
+                st.markdown(f"**{name.replace('_', ' ').capitalize()}:** {text}")
+        for name, text in texts["outputs"].items():
+            st.subheader(name.replace("_", " ").capitalize())
+            st.markdown(strip_scores(text))
+            if entry["models"].get(name):
+                st.caption(f"Answered by {entry['models'][name]}")
+
+if __name__ == "__main__":
+    main()
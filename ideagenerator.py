@@ -1,20 +1,14 @@
-import openai
 import streamlit as st
 
-# Streamlit App UI
-st.title("Innovative Solution Generator")
+import jobs
+import llm_client
+import pipeline
 
-st.write("This tool helps you generate innovative, technology-based solutions for your problem.")
+# Outputs of a solutions job and their subheaders
+SECTIONS = [("solutions", "Innovative Solutions")]
 
-# Retrieve the OpenAI API Key from Streamlit secrets
-openai_api_key = st.secrets["general"]["OPENAI_API_KEY"]
-
-# Set the OpenAI API key
-openai.api_key = openai_api_key
-
-
-# Function to generate innovative solutions
-def generate_innovative_solutions(problem_description, target_audience):
+# Function to generate innovative solutions; with a placeholder the answer is streamed into the page
+def generate_innovative_solutions(problem_description, target_audience, placeholder=None):
     prompt = f"""
     You are an expert in innovation and technology. Given the following problem and the target audience, suggest five innovative, technology-based solutions. Describe each solution in detail, focusing on the specific technology, how the product, software, or service would work, and what it would look like.
 
@@ -24,40 +18,59 @@ def generate_innovative_solutions(problem_description, target_audience):
     Provide five different solutions with detailed descriptions for each:
     """
 
-    response = openai.ChatCompletion.create(
-        model="gpt-4-turbo",
-        messages=[
-            {"role": "system", "content": "You are a leading expert in innovation and technology, focusing on developing new products, software, services, and processes."},
-            {"role": "user", "content": prompt}
-        ]
+    messages = [
+        {"role": "system", "content": "You are a leading expert in innovation and technology, focusing on developing new products, software, services, and processes."},
+        {"role": "user", "content": prompt}
+    ]
+    params = dict(app="ideas", stage="solutions")
+    if placeholder is not None:
+        return llm_client.complete_into(placeholder, messages, **params)
+    return llm_client.complete(messages, **params)
+
+# Function to generate the solutions as a background job (see jobs.py)
+def run_job(params, progress):
+    solutions = generate_innovative_solutions(params["problem_description"], params["target_audience"], placeholder=progress.placeholder("solutions"))
+    progress.finish("solutions", solutions)
+
+# Streamlit App
+def main():
+    jobs.register("ideas", run_job)
+
+    st.title("Innovative Solution Generator")
+
+    st.write("This tool helps you generate innovative, technology-based solutions for your problem.")
+
+    # Input: Problem Description
+    problem_description = st.text_area(
+        "Describe the problem:",
+        pipeline.value("problem"),
+        placeholder="What is the problem?",
+        help="Describe the problem you want to solve."
+    )
+
+    # Input: Target Audience
+    target_audience = st.text_area(
+        "Who has the problem?",
+        pipeline.value("audience"),
+        placeholder="Who is affected by this problem?",
+        help="Describe the group or individuals who are affected by the problem."
     )
 
-    solutions = response.choices[0].message['content']
-    return solutions
-
-# Input: Problem Description
-problem_description = st.text_area(
-    "Describe the problem:",
-    placeholder="What is the problem?",
-    help="Describe the problem you want to solve."
-)
-
-# Input: Target Audience
-target_audience = st.text_area(
-    "Who has the problem?",
-    placeholder="Who is affected by this problem?",
-    help="Describe the group or individuals who are affected by the problem."
-)
-
-# Button to generate solutions
-if st.button("Generate Solutions"):
-    if problem_description and target_audience:
-        try:
-            solutions = generate_innovative_solutions(problem_description, target_audience)
-            st.subheader("Innovative Solutions")
-            st.write(solutions)
-        except Exception as e:
-            st.error(f"An error occurred: {e}")
-    else:
-        st.warning("Please enter both the problem description and target audience to generate solutions.")
+    # Button to generate solutions; they are generated in a background job that survives reruns and reconnects
+    if st.button("Generate Solutions"):
+        if problem_description and target_audience:
+            jobs.start("ideas_job", "ideas", {"problem_description": problem_description, "target_audience": target_audience})
+        else:
+            st.warning("Please enter both the problem description and target audience to generate solutions.")
+
+    job = jobs.show(jobs.tracked("ideas_job"), SECTIONS)
+
+    # Pipeline mode: the chosen solution goes on to the competitor analysis, which starts right away
+    if job is not None and job["status"] == "done" and pipeline.enabled():
+        solutions = pipeline.split_solutions(job["outputs"].get("solutions"))
+        if solutions:
+            chosen = st.radio("Solution to carry forward:", range(len(solutions)), format_func=lambda index: pipeline.solution_label(solutions[index]))
+            pipeline.advance("ideas", problem=job["params"]["problem_description"], audience=job["params"]["target_audience"], solution=solutions[chosen])
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+import history
+
+# Background jobs for long LLM work. A page submits a job and only polls it, so a rerun, a closed tab or a dropped
+# connection no longer throws away calls that are already paid for, and the script thread never blocks on the API.
+# Jobs live in a SQLite table (finished stage outputs included) and run on a thread pool in the server process;
+# threads rather than processes, so every job shares the response cache, in-flight coalescing and rate limiter.
+# Streamed partial text is kept in memory only. Every server process marks the jobs it runs with a random ID and
+# keeps a heartbeat for it in the database; a job left "running" by a server that went away (its heartbeat stopped,
+# even if the restarted server got the same PID) is queued again the next time a page registers its kind.
+# Completed jobs are also recorded in the analysis history (history.py).
+
+JOBS_PATH = os.environ.get("JOBS_PATH", os.path.join(".cache", "jobs.sqlite"))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "8"))  # Jobs running at the same time per server process
+JOB_TTL = float(os.environ.get("JOB_TTL", str(7 * 24 * 3600)))  # Finished jobs are kept this long (seconds)
+POLL_SECONDS = 1.0  # How often pages refresh a running job
+HEARTBEAT_SECONDS = 10.0  # A server whose heartbeat is three times older than this is gone
+
+# Marks the jobs run by this server process; unique per process start, unlike the PID
+PROCESS_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:12]}"
+
+ACTIVE = ("queued", "running")
+
+
+class Progress:
+    def __init__(self, store, job_id, cancel):
+        self.store = store
+        self.job_id = job_id
+        self.cancel = cancel  # threading.Event set when the job is cancelled
+
+    # Raise llm_client.Cancelled once the job was cancelled; runners call it before each stage
+    def check(self):
+        if self.cancel.is_set():
+            import llm_client
+
+            raise llm_client.Cancelled("The job was cancelled.")
+
+    # Record the partial text of an output while it streams
+    def update(self, key, text):
+        self.check()
+        self.store._partial(self.job_id, key, text)
+
+    # Record the final text of an output (and the model that answered it, if known)
+    def finish(self, key, text):
+        self.check()
+        self.store._finish_output(self.job_id, key, text, getattr(text, "model", None))
+
+    # Stand-in for st.empty() that streams into the job's output, for functions that render into a placeholder
+    def placeholder(self, key):
+        return _ProgressPlaceholder(self, key)
+
+
+class _ProgressPlaceholder:
+    def __init__(self, progress, key):
+        self.progress = progress
+        self.key = key
+
+    def markdown(self, text):
+        self.progress.update(self.key, text.rstrip("▌"))
+
+    write = markdown
+
+
+class JobStore:
+    def __init__(self, path=JOBS_PATH, workers=JOB_WORKERS):
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL, status TEXT NOT NULL, "
+            "outputs TEXT NOT NULL DEFAULT '{}', models TEXT NOT NULL DEFAULT '{}', error TEXT, worker TEXT, "
+            "created REAL NOT NULL, started REAL, finished REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, kind)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS workers (id TEXT PRIMARY KEY, beat REAL NOT NULL)")
+        self._beat()
+        threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True).start()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._runners = {}  # kind -> fn(params, progress)
+        self._partials = {}  # job id -> {output key: partial text}
+        self._cancels = {}  # job id -> threading.Event
+
+    # Make a kind of job runnable in this process and pick up its queued or orphaned jobs
+    def register(self, kind, fn):
+        with self._lock:
+            first = kind not in self._runners
+            self._runners[kind] = fn
+            if not first:
+                return
+            rows = self._db.execute("SELECT id, status, worker FROM jobs WHERE kind = ? AND status IN ('queued', 'running')", (kind,)).fetchall()
+            alive = {worker for worker, in self._db.execute("SELECT id FROM workers WHERE beat > ?", (time.time() - 3 * HEARTBEAT_SECONDS,))}
+            for job_id, status, worker in rows:
+                if status == "running" and (worker == PROCESS_ID or worker in alive):
+                    continue
+                # Only if the job is still as it was read: another process may have requeued, claimed or cancelled it since
+                requeued = self._db.execute(
+                    "UPDATE jobs SET status = 'queued', worker = NULL WHERE id = ? AND status = ? AND worker IS ?",
+                    (job_id, status, worker),
+                ).rowcount
+                if requeued:
+                    self._pool.submit(self._run, job_id)
+
+    # Queue a job and return its ID
+    def submit(self, kind, params):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE finished < ?", (now - JOB_TTL,))
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, params, status, created) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, kind, json.dumps(params, ensure_ascii=False), now),
+            )
+        self._pool.submit(self._run, job_id)
+        return job_id
+
+    # Return a job as a dict (outputs include the text streamed so far), or None for an unknown ID
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, kind, params, status, outputs, models, error, created, started, finished FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+            partial = dict(self._partials.get(job_id, {}))
+        if row is None:
+            return None
+        job = dict(zip(("id", "kind", "params", "status", "outputs", "models", "error", "created", "started", "finished"), row))
+        for name in ("params", "outputs", "models"):
+            job[name] = json.loads(job[name])
+        job["outputs"] = {**partial, **job["outputs"]}
+        return job
+
+    # Stop a queued or running job
+    def cancel(self, job_id):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status IN ('queued', 'running')", (time.time(), job_id))
+            if job_id in self._cancels:
+                self._cancels[job_id].set()
+
+    def _run(self, job_id):
+        with self._lock:
+            # Claim the job; another worker or process may have taken it already
+            claimed = self._db.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, started = ? WHERE id = ? AND status = 'queued'",
+                (PROCESS_ID, time.time(), job_id),
+            ).rowcount
+            row = self._db.execute("SELECT kind, params FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if not claimed or row is None:
+                return
+            cancel = self._cancels[job_id] = threading.Event()
+        kind, params = row
+        try:
+            self._runners[kind](json.loads(params), Progress(self, job_id, cancel))
+        except Exception as e:
+            self._end(job_id, "cancelled" if cancel.is_set() else "failed", str(e) or type(e).__name__)
+        else:
+            self._end(job_id, "cancelled" if cancel.is_set() else "done", None)
+            job = self.get(job_id)
+            if job["status"] == "done":
+                history.record(kind, job["params"], job["outputs"], job["models"])
+
+    def _end(self, job_id, status, error):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished = COALESCE(finished, ?) WHERE id = ? AND status = 'running'",
+                (status, error, time.time(), job_id),
+            )
+            self._partials.pop(job_id, None)
+            self._cancels.pop(job_id, None)
+
+    # Record that this server process is alive, and forget servers that have been gone for a day
+    def _beat(self):
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO workers (id, beat) VALUES (?, ?)", (PROCESS_ID, now))
+            self._db.execute("DELETE FROM workers WHERE beat < ?", (now - 24 * 3600,))
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            try:
+                self._beat()
+            except sqlite3.Error:
+                pass  # A busy database delays one beat; the next one catches up
+
+    def _partial(self, job_id, key, text):
+        with self._lock:
+            self._partials.setdefault(job_id, {})[key] = text
+
+    def _finish_output(self, job_id, key, text, model):
+        with self._lock:
+            outputs, models = self._db.execute("SELECT outputs, models FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            outputs, models = json.loads(outputs), json.loads(models)
+            outputs[key] = str(text)
+            models[key] = model
+            self._db.execute(
+                "UPDATE jobs SET outputs = ?, models = ? WHERE id = ?",
+                (json.dumps(outputs, ensure_ascii=False), json.dumps(models), job_id),
+            )
+            self._partials.get(job_id, {}).pop(key, None)
+
+
+_store_lock = threading.Lock()
+_store = None
+
+
+# Function to get the process-wide job store
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = JobStore()
+        return _store
+
+
+def register(kind, fn):
+    get_store().register(kind, fn)
+
+
+def submit(kind, params):
+    return get_store().submit(kind, params)
+
+
+def get(job_id):
+    return get_store().get(job_id)
+
+
+def cancel(job_id):
+    get_store().cancel(job_id)
+
+
+# Function to remember a page's current job in the session and the URL, so a reload or reconnect finds it again
+def track(name, job_id):
+    st.session_state[name] = job_id
+    st.query_params[name] = job_id
+
+
+# Function to forget a page's current job, cancelling it if it is still running
+def untrack(name):
+    _cancel_tracked(name)
+    st.session_state.pop(name, None)
+    if name in st.query_params:
+        del st.query_params[name]
+
+
+# Function to submit a page's job and track it in place of its current one, which is cancelled if it is still
+# running (the user submitted the form again); returns the new job's ID
+def start(name, kind, params):
+    _cancel_tracked(name)
+    job_id = submit(kind, params)
+    track(name, job_id)
+    return job_id
+
+
+def _cancel_tracked(name):
+    job = get(tracked(name)) if tracked(name) else None
+    if job is not None and job["status"] in ACTIVE:
+        cancel(job["id"])
+
+
+# Function to get a page's current job ID from the session or the URL, or None
+def tracked(name):
+    return st.session_state.get(name) or st.query_params.get(name)
+
+
+# Function to render a job's outputs under their subheaders; sections is a list of (output key, subheader)
+def show_outputs(job, sections, render=None):
+    active = job["status"] in ACTIVE
+    for key, title in sections:
+        st.subheader(title)
+        text = job["outputs"].get(key)
+        if text is None:
+            st.info("Analysing..." if active else "No output.")
+            continue
+        text = render(text) if render else text
+        st.markdown(text + "▌" if active and key not in job["models"] else text)
+
+
+# Function (a fragment, so only this part of the page reruns) to refresh a running job until it ends, then rerun the page
+@st.fragment(run_every=POLL_SECONDS)
+def poll(job_id, sections, render=None):
+    job = get(job_id)
+    if job is None or job["status"] not in ACTIVE:
+        st.rerun()
+    show_outputs(job, sections, render)
+    st.button("Cancel", key=f"cancel_{job_id}", on_click=cancel, args=(job_id,))
+
+
+# Function to show a page's job: live while it runs, then its results; returns the job (None for an unknown ID)
+def show(job_id, sections, render=None):
+    job = get(job_id) if job_id else None
+    if job is None:
+        return None
+    if job["status"] in ACTIVE:
+        poll(job_id, sections, render)
+        return job
+    show_outputs(job, sections, render)
+    if job["status"] == "failed":
+        st.error(f"An error occurred: {job['error']}")
+    elif job["status"] == "cancelled":
+        st.info("The analysis was cancelled.")
+    return job
@@ -1,124 +1,252 @@
 import streamlit as st
-import openai
-import time
-
-# Set the OpenAI API key
-openai.api_key = st.secrets["openai"]["openai_api_key"]
-
-# Function to generate text using the Chat API (gpt-4)
-def generate_text(prompt, max_tokens=500):
-    response = openai.ChatCompletion.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant that provides specific and practical advice."},
-            {"role": "user", "content": prompt},
-        ],
-        max_tokens=max_tokens,
-        n=1,
-        stop=None,
-        temperature=0.7,
-    )
-    return response['choices'][0]['message']['content'].strip()
-
-# Step 1: Problem and Solution Description
-st.title("Startup Idea Validator")
-
-st.header("Step 1: Define the Problem and Solution")
-problem_description = st.text_area(
-    "Describe the Problem", 
-    "Please describe briefly the problem that you are addressing. Consider the pain points and the outcome the customers desire."
-)
-solution_description = st.text_area(
-    "Describe Your Solution or Idea", 
-    "Describe how your solution addresses the problem. What is the key value proposition?"
-)
-
-# Button to move to Step 2
-if st.button("Proceed to Customer Segments"):
-    if problem_description and solution_description:
-        st.session_state.problem_description = problem_description
-        st.session_state.solution_description = solution_description
-    else:
-        st.warning("Please complete both the problem and solution description before proceeding.")
-
-# Step 2: Customer Segments (Appears after Step 1 is completed)
-if 'problem_description' in st.session_state and 'solution_description' in st.session_state:
-    st.header("Step 2: Identify Target Customer Segments")
-    
-    # Generate a tailored question based on the input from Step 1
-    customer_segments_prompt = (
-        f"Based on the following problem: '{st.session_state.problem_description}', and solution: '{st.session_state.solution_description}', "
-        "please describe the customer segments or user groups most affected by the problem and who would benefit the most from the solution."
-    )
-    st.write(customer_segments_prompt)
+import hashlib
+import os
 
-    customer_segments = st.text_area(
-        "Who are your target customers?",
-        "Describe the customer segments or user groups."
-    )
+import history
+import jobs
+import llm_client
+import pipeline
+import resilience
+from compaction import compact
+from rate_limiter import approximate_tokens
 
-    # Button to confirm customer segments and proceed to next steps
-    if st.button("Proceed to Hypotheses and MVP"):
-        if customer_segments:
-            st.session_state.customer_segments = customer_segments
-        else:
-            st.warning("Please describe the customer segments before proceeding.")
+# Token budget for each upstream output passed into the Step 5 prompt after compaction
+CONTEXT_TOKENS = int(os.environ.get("LEAN_CONTEXT_TOKENS", "200"))
+# Upper bound on a stage's prompt (approximate tokens); larger prompts are not sent
+STAGE_INPUT_TOKENS = int(os.environ.get("LEAN_STAGE_INPUT_TOKENS", "1500"))
 
-# Step 3: Hypotheses Generation (Appears after Step 2 is completed)
-if 'customer_segments' in st.session_state:
-    st.header("Step 3: Hypotheses for Validation")
-    
-    hypotheses_prompt = (
+# Outputs of a validation job and their subheaders (shown while a job started by the pipeline runs)
+SECTIONS = [
+    ("hypotheses", "Step 3: Hypotheses for Validation"),
+    ("mvp", "Step 4: Minimum Viable Product (MVP) and Feature Integration Roadmap"),
+    ("testing", "Step 5: Recommendations for Initial Testing"),
+]
+
+# Function to generate text using the Chat API (gpt-4, routed per stage); with a placeholder the text is streamed into the page
+def generate_text(prompt, max_tokens=500, placeholder=None, stage=None):
+    messages = [
+        {"role": "system", "content": "You are a helpful assistant that provides specific and practical advice."},
+        {"role": "user", "content": prompt},
+    ]
+    params = dict(max_tokens=max_tokens, n=1, stop=None, temperature=0.7, app="lean", stage=stage)
+    if placeholder is not None:
+        return llm_client.complete_into(placeholder, messages, **params)
+    return llm_client.complete(messages, **params)
+
+# Function to build the Step 3 prompt (hypotheses for validation)
+def build_hypotheses_prompt(problem_description, solution_description, customer_segments):
+    return (
         f"Based on the following details:\n"
-        f"Problem: {st.session_state.problem_description}\n"
-        f"Solution: {st.session_state.solution_description}\n"
-        f"Customer Segments: {st.session_state.customer_segments}\n\n"
+        f"Problem: {problem_description}\n"
+        f"Solution: {solution_description}\n"
+        f"Customer Segments: {customer_segments}\n\n"
         "Please generate the following hypotheses:\n"
         "1. A Value Hypothesis that identifies the critical uncertainties and open questions related to whether the solution will effectively address the specific problems of the identified customer segments.\n"
         "2. A Growth Hypothesis that focuses on the uncertainties related to the solution's scalability within these customer segments and market potential.\n"
         "3. Additional hypotheses that address the most relevant and uncertain aspects like pricing, market size, or customer behavior specifically related to these customer segments.\n\n"
         "In addition, please provide 4-5 specific, one-sentence hypotheses that focus on critical uncertainties essential for the success of the solution. These could include hypotheses related to customer usage patterns, long-term benefits for customers, willingness to pay, time required to adopt the solution, and the convenience of the solution."
     )
-    
-    try:
-        hypotheses_response = generate_text(hypotheses_prompt)
-        st.session_state.hypotheses = hypotheses_response  # Store the hypotheses for later use
-        st.write(hypotheses_response)
-    except openai.error.RateLimitError:
-        st.warning("Rate limit reached. Please wait a moment and try again.")
-        time.sleep(20)
-
-    # Step 4: MVP Suggestion
-    st.header("Step 4: Minimum Viable Product (MVP) and Feature Integration Roadmap")
-    
-    mvp_prompt = (
-        f"Given the problem '{st.session_state.problem_description}', solution '{st.session_state.solution_description}', and customer segments '{st.session_state.customer_segments}', "
+
+# Function to build the Step 4 prompt (MVP and feature integration roadmap)
+def build_mvp_prompt(problem_description, solution_description, customer_segments):
+    return (
+        f"Given the problem '{problem_description}', solution '{solution_description}', and customer segments '{customer_segments}', "
         "please provide a highly focused suggestion for a Minimum Viable Product (MVP) that includes only the most essential features necessary to test the core hypothesis with these customer segments. "
         "Also, provide a roadmap for integrating additional features over time, focusing on early prototypes, simulations, or experiments that allow for low-risk testing of the solution among the identified customer segments."
     )
-    
-    try:
-        mvp_response = generate_text(mvp_prompt)
-        st.session_state.mvp_suggestions = mvp_response  # Store the MVP suggestions for later use
-        st.write(mvp_response)
-    except openai.error.RateLimitError:
-        st.warning("Rate limit reached. Please wait a moment and try again.")
-        time.sleep(20)
-
-    # Step 5: Recommendations for Initial Testing
-    st.header("Step 5: Recommendations for Initial Testing")
-    
-    testing_prompt = (
-        f"Based on the following hypotheses:\n{st.session_state.hypotheses}\n"
-        f"And the following MVP suggestions:\n{st.session_state.mvp_suggestions}\n"
+
+# Function to build the Step 5 prompt (recommendations for initial testing) from the Step 3 and 4 outputs,
+# compacted to their essential bullet items
+def build_testing_prompt(hypotheses, mvp_suggestions):
+    return (
+        f"Based on the following hypotheses:\n{compact(hypotheses, CONTEXT_TOKENS)}\n"
+        f"And the following MVP suggestions:\n{compact(mvp_suggestions, CONTEXT_TOKENS)}\n"
         "Recommend the three most important initial tests, checks, analyses, surveys, observational studies, or data analysis steps "
         "that the innovators and founders should prioritize to validate their assumptions with the identified customer segments and de-risk the project. "
         "Please include specific questions to ask these customer segments, key data points to analyze, types of test customers to involve, and the critical financial variables to assess."
     )
+
+# Function to reject a stage prompt above STAGE_INPUT_TOKENS before any API call
+def check_stage_input(name, prompt):
+    input_tokens = approximate_tokens(prompt)
+    if input_tokens > STAGE_INPUT_TOKENS:
+        raise ValueError(f"The {name} prompt is about {input_tokens} tokens, above the limit of {STAGE_INPUT_TOKENS}. Please shorten your descriptions.")
+
+# Function to run a validation stage only when its inputs changed.
+# Each stage output is memoized in the session against a hash of its prompt, which embeds all upstream inputs,
+# so Streamlit reruns reuse the stored text and a changed upstream output invalidates every stage that depends on it.
+def run_stage(name, prompt, placeholder):
+    stages = st.session_state.setdefault("stages", {})
+    inputs_hash = prompt_hash(prompt)
+    if name in stages and stages[name][0] == inputs_hash:
+        placeholder.write(stages[name][1])
+        return stages[name][1]
+
+    check_stage_input(name, prompt)
+    output = generate_text(prompt, placeholder=placeholder, stage=name)
+    stages[name] = (inputs_hash, output)
+    return output
+
+def prompt_hash(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+# Function to run Steps 3-5 as a background job (see jobs.py). The pipeline starts it before the page is opened,
+# and the page takes the stages from it (see use_prefetched_job) instead of requesting them again.
+def run_job(params, progress):
+    problem_description, solution_description, customer_segments = params["problem_description"], params["solution_description"], params["customer_segments"]
+    outputs = {}
+    for name, prompt in (
+        ("hypotheses", build_hypotheses_prompt(problem_description, solution_description, customer_segments)),
+        ("mvp", build_mvp_prompt(problem_description, solution_description, customer_segments)),
+    ):
+        progress.check()
+        check_stage_input(name, prompt)
+        outputs[name] = generate_text(prompt, placeholder=progress.placeholder(name), stage=name)
+        progress.finish(name, outputs[name])
+    progress.check()
+    testing_prompt = build_testing_prompt(outputs["hypotheses"], outputs["mvp"])
+    check_stage_input("testing", testing_prompt)
+    progress.finish("testing", generate_text(testing_prompt, placeholder=progress.placeholder("testing"), stage="testing"))
+
+# Function to take the stages from the job the pipeline started, if it ran for the same inputs as the page.
+# Finished stage outputs are stored in the stage memo (see run_stage), so the page shows them without another call;
+# returns the job while it is still running, so the page can follow it instead of sending the same requests.
+def use_prefetched_job(params):
+    job_id = jobs.tracked("lean_job")
+    job = jobs.get(job_id) if job_id else None
+    if job is None or job["params"] != params:
+        return None
+    if job["status"] in jobs.ACTIVE:
+        return job
+    outputs = {name: llm_client.Completion(text, job["models"].get(name)) for name, text in job["outputs"].items() if name in job["models"]}
+    prompts = {
+        "hypotheses": build_hypotheses_prompt(params["problem_description"], params["solution_description"], params["customer_segments"]),
+        "mvp": build_mvp_prompt(params["problem_description"], params["solution_description"], params["customer_segments"]),
+    }
+    if "hypotheses" in outputs and "mvp" in outputs:
+        prompts["testing"] = build_testing_prompt(outputs["hypotheses"], outputs["mvp"])
+    stages = st.session_state.setdefault("stages", {})
+    for name, prompt in prompts.items():
+        if name in outputs:
+            stages[name] = (prompt_hash(prompt), outputs[name])
+    return None
+
+# Streamlit App
+def main():
+    # Pipeline mode: the earlier tools already described the problem, the solution and the customers, so Steps 1 and 2 are filled in
+    handed_off = pipeline.next_params("lean") if pipeline.enabled() else None
+    if handed_off and st.session_state.get("lean_handoff") != handed_off:
+        st.session_state.update(handed_off)
+        st.session_state.lean_handoff = handed_off
+
+    # Step 1: Problem and Solution Description
+    st.title("Startup Idea Validator")
+
+    st.header("Step 1: Define the Problem and Solution")
+    problem_description = st.text_area(
+        "Describe the Problem", 
+        pipeline.value("problem", "Please describe briefly the problem that you are addressing. Consider the pain points and the outcome the customers desire.")
+    )
+    solution_description = st.text_area(
+        "Describe Your Solution or Idea", 
+        pipeline.value("solution", "Describe how your solution addresses the problem. What is the key value proposition?")
+    )
+
+    # Button to move to Step 2
+    if st.button("Proceed to Customer Segments"):
+        if problem_description and solution_description:
+            st.session_state.problem_description = problem_description
+            st.session_state.solution_description = solution_description
+        else:
+            st.warning("Please complete both the problem and solution description before proceeding.")
+
+    # Step 2: Customer Segments (Appears after Step 1 is completed)
+    if 'problem_description' in st.session_state and 'solution_description' in st.session_state:
+        st.header("Step 2: Identify Target Customer Segments")
     
-    try:
-        testing_response = generate_text(testing_prompt)
-        st.write(testing_response)
-    except openai.error.RateLimitError:
-        st.warning("Rate limit reached. Please wait a moment and try again.")
-        time.sleep(20)
+        # Generate a tailored question based on the input from Step 1
+        customer_segments_prompt = (
+            f"Based on the following problem: '{st.session_state.problem_description}', and solution: '{st.session_state.solution_description}', "
+            "please describe the customer segments or user groups most affected by the problem and who would benefit the most from the solution."
+        )
+        st.write(customer_segments_prompt)
+
+        customer_segments = st.text_area(
+            "Who are your target customers?",
+            pipeline.value("audience", "Describe the customer segments or user groups.")
+        )
+
+        # Button to confirm customer segments and proceed to next steps
+        if st.button("Proceed to Hypotheses and MVP"):
+            if customer_segments:
+                st.session_state.customer_segments = customer_segments
+            else:
+                st.warning("Please describe the customer segments before proceeding.")
+
+    # Step 3: Hypotheses Generation (Appears after Step 2 is completed)
+    if 'customer_segments' in st.session_state:
+        import openai  # Only needed once the LLM stages run; it is slow to import
+
+        # In pipeline mode the stages may already be running (or done) in the background
+        params = {name: st.session_state[name] for name in ("problem_description", "solution_description", "customer_segments")}
+        running = use_prefetched_job(params)
+        if running is not None:
+            jobs.show(running["id"], SECTIONS)
+            return
+
+        st.header("Step 3: Hypotheses for Validation")
+    
+        hypotheses_prompt = build_hypotheses_prompt(st.session_state.problem_description, st.session_state.solution_description, st.session_state.customer_segments)
+    
+        try:
+            hypotheses_response = run_stage("hypotheses", hypotheses_prompt, st.empty())
+            st.session_state.hypotheses = hypotheses_response  # Store the hypotheses for later use
+        except openai.error.RateLimitError:
+            st.warning("Rate limit reached. Please wait a moment and try again.")
+        except (ValueError, resilience.CircuitOpen) as e:
+            st.warning(str(e))
+        # The API kept failing after the retries, or the stage ran out of time; the later steps still render
+        except (openai.error.OpenAIError, llm_client.DeadlineExceeded, llm_client.Cancelled) as e:
+            st.warning(f"The hypotheses could not be generated: {e}")
+
+        # Step 4: MVP Suggestion
+        st.header("Step 4: Minimum Viable Product (MVP) and Feature Integration Roadmap")
+    
+        mvp_prompt = build_mvp_prompt(st.session_state.problem_description, st.session_state.solution_description, st.session_state.customer_segments)
+    
+        try:
+            mvp_response = run_stage("mvp", mvp_prompt, st.empty())
+            st.session_state.mvp_suggestions = mvp_response  # Store the MVP suggestions for later use
+        except openai.error.RateLimitError:
+            st.warning("Rate limit reached. Please wait a moment and try again.")
+        except (ValueError, resilience.CircuitOpen) as e:
+            st.warning(str(e))
+        except (openai.error.OpenAIError, llm_client.DeadlineExceeded, llm_client.Cancelled) as e:
+            st.warning(f"The MVP suggestions could not be generated: {e}")
+
+        # Step 5: Recommendations for Initial Testing
+        st.header("Step 5: Recommendations for Initial Testing")
+    
+        if 'hypotheses' in st.session_state and 'mvp_suggestions' in st.session_state:
+            testing_prompt = build_testing_prompt(st.session_state.hypotheses, st.session_state.mvp_suggestions)
+    
+            try:
+                testing_response = run_stage("testing", testing_prompt, st.empty())
+                # The validation is complete; keep it in the analysis history (an unchanged rerun keeps a single entry)
+                history.record(
+                    "lean",
+                    params,
+                    {"hypotheses": st.session_state.hypotheses, "mvp": st.session_state.mvp_suggestions, "testing": testing_response},
+                    {"hypotheses": getattr(st.session_state.hypotheses, "model", None), "mvp": getattr(st.session_state.mvp_suggestions, "model", None), "testing": getattr(testing_response, "model", None)},
+                )
+            except openai.error.RateLimitError:
+                st.warning("Rate limit reached. Please wait a moment and try again.")
+            except (ValueError, resilience.CircuitOpen) as e:
+                st.warning(str(e))
+            except (openai.error.OpenAIError, llm_client.DeadlineExceeded, llm_client.Cancelled) as e:
+                st.warning(f"The testing recommendations could not be generated: {e}")
+        else:
+            st.info("The recommendations need the hypotheses and MVP suggestions from Steps 3 and 4.")
+
+if __name__ == "__main__":
+    main()
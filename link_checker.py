@@ -0,0 +1,301 @@
+import ipaddress
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urljoin, urlsplit
+
+# Verification of the links a model puts into an answer. All URLs are fetched at once over one pooled session,
+# with at most LINK_MAX_PER_HOST connections to any host and a connect/read timeout per request, and the whole
+# check is bounded by LINK_DEADLINE: links that have not answered by then are reported as not verified instead of
+# holding up the page. Results (live or dead, HTTP status, page title) are cached on disk by URL; failures are kept
+# for a shorter time than live links, since they are often transient.
+# The links come from model output that users can steer, so only public addresses are fetched: every connection,
+# for the link and for each redirect, checks the address it actually connected to before the request is sent, and
+# refuses loopback, private, link-local (cloud metadata) and other non-public addresses. Checking the connected
+# socket rather than resolving the host beforehand leaves no window for DNS rebinding. Links are fetched directly,
+# not through a proxy from the environment, since the proxy would do the resolving. LINK_ALLOW_PRIVATE=1 lifts the
+# check, e.g. to test against the local mock server.
+# requests and BeautifulSoup are imported on the first check rather than at page load.
+
+LINK_CHECK_ENABLED = os.environ.get("LINK_CHECK_ENABLED", "1") != "0"
+LINK_CACHE_PATH = os.environ.get("LINK_CACHE_PATH", os.path.join(".cache", "links.sqlite"))
+LINK_CACHE_TTL = float(os.environ.get("LINK_CACHE_TTL", str(24 * 3600)))  # Seconds a live link is trusted
+LINK_CACHE_DEAD_TTL = float(os.environ.get("LINK_CACHE_DEAD_TTL", "3600"))  # Seconds a failed check is trusted
+LINK_DEADLINE = float(os.environ.get("LINK_DEADLINE", "3"))  # Seconds for checking all links of an answer
+LINK_CONNECT_TIMEOUT = float(os.environ.get("LINK_CONNECT_TIMEOUT", "2"))
+LINK_READ_TIMEOUT = float(os.environ.get("LINK_READ_TIMEOUT", "2.5"))
+LINK_MAX_PER_HOST = int(os.environ.get("LINK_MAX_PER_HOST", "2"))  # Concurrent connections to one host
+LINK_WORKERS = int(os.environ.get("LINK_WORKERS", "16"))  # Concurrent checks per process
+LINK_ALLOW_PRIVATE = os.environ.get("LINK_ALLOW_PRIVATE", "0") == "1"  # Also fetch loopback and private addresses
+LINK_MAX_URLS = 30  # Links checked per answer
+MAX_REDIRECTS = 5
+MAX_PAGE_BYTES = 256 * 1024  # Read at most this much of a page when looking for its title
+USER_AGENT = "Mozilla/5.0 (compatible; ProblemTransformer-LinkChecker/1.0)"
+
+# A markdown link [text](url), an autolink <url> or a bare URL
+_LINK = re.compile(r"\[[^\]\n]*\]\((?P<md>https?://[^\s)]+)\)|(?P<angle><)?(?P<bare>https?://[^\s<>()\[\]\"'`]+)(?(angle)>)")
+_TRAILING = ".,;:!?*_"  # Punctuation after a bare URL that belongs to the sentence
+# Characters with a meaning in (Streamlit) markdown; page titles are shown with these backslash-escaped
+_MARKDOWN = re.compile(r"([\\`*_{}\[\]()#+\-.!|<>~$:])")
+
+
+class LinkCheck:
+    def __init__(self, url, live, status=None, title=None, error=None):
+        self.url = url
+        self.live = live  # True, False, or None when the link was not checked in time
+        self.status = status  # HTTP status of the final response
+        self.title = title
+        self.error = error  # Why a link is dead when there is no status, e.g. "timeout"
+
+    def as_dict(self):
+        return {"url": self.url, "live": self.live, "status": self.status, "title": self.title, "error": self.error}
+
+
+# Raised when a connection reached a non-public address
+class AddressRefused(Exception):
+    pass
+
+
+class LinkCache:
+    def __init__(self, path=LINK_CACHE_PATH, ttl=LINK_CACHE_TTL, dead_ttl=LINK_CACHE_DEAD_TTL):
+        self.ttl = ttl
+        self.dead_ttl = dead_ttl
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS links (url TEXT PRIMARY KEY, result TEXT NOT NULL, expires REAL NOT NULL)")
+
+    # Return the cached LinkCheck of each URL that has an unexpired entry, as {url: LinkCheck}
+    def get_many(self, urls):
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT result FROM links WHERE url IN ({','.join('?' * len(urls))}) AND expires > ?", (*urls, now)
+            ).fetchall()
+        checks = [LinkCheck(**json.loads(result)) for result, in rows]
+        return {check.url: check for check in checks}
+
+    def set(self, check):
+        expires = time.time() + (self.ttl if check.live else self.dead_ttl)
+        with self._lock:
+            self._db.execute("DELETE FROM links WHERE expires < ?", (time.time(),))
+            self._db.execute(
+                "INSERT OR REPLACE INTO links (url, result, expires) VALUES (?, ?, ?)",
+                (check.url, json.dumps(check.as_dict(), ensure_ascii=False), expires),
+            )
+
+
+def _url(match):
+    if match.group("md"):
+        return match.group("md")
+    return match.group("bare") if match.group("angle") else match.group("bare").rstrip(_TRAILING)
+
+
+# Function to find the distinct http(s) URLs in a text, in order of appearance
+def extract_urls(text):
+    urls = []
+    for match in _LINK.finditer(text or ""):
+        url = _url(match)
+        if url not in urls:
+            urls.append(url)
+    return urls[:LINK_MAX_URLS]
+
+
+_lock = threading.Lock()
+_session = None
+_pool = None
+_host_slots = {}  # host -> BoundedSemaphore of LINK_MAX_PER_HOST connections
+_cache = None
+_background = None  # Runs check_links for check_text_async, apart from the fetch workers it waits on
+
+
+# Function to tell whether an IP address (as returned by getaddrinfo or getpeername) is public
+def _is_public(address):
+    address = ipaddress.ip_address(address.split("%")[0])
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return address.is_global and not address.is_multicast
+
+
+# Function to refuse a freshly connected socket whose peer is not a public address, before anything is sent over it
+def _check_peer(sock):
+    if LINK_ALLOW_PRIVATE:
+        return
+    if not _is_public(sock.getpeername()[0]):
+        sock.close()
+        raise AddressRefused("not a public address")
+
+
+# Function to create the session's adapter: one small keep-alive pool per host (the per-host semaphores keep
+# requests within it) whose connections check the address they connected to
+def _public_adapter():
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class PublicHTTPConnection(HTTPConnection):
+        def _new_conn(self):
+            sock = super()._new_conn()
+            _check_peer(sock)
+            return sock
+
+    # HTTPS connections check the peer before the TLS handshake
+    class PublicHTTPSConnection(HTTPSConnection):
+        def _new_conn(self):
+            sock = super()._new_conn()
+            _check_peer(sock)
+            return sock
+
+    class PublicHTTPPool(HTTPConnectionPool):
+        ConnectionCls = PublicHTTPConnection
+
+    class PublicHTTPSPool(HTTPSConnectionPool):
+        ConnectionCls = PublicHTTPSConnection
+
+    class PublicAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {"http": PublicHTTPPool, "https": PublicHTTPSPool}
+
+    return PublicAdapter(pool_connections=LINK_WORKERS, pool_maxsize=LINK_MAX_PER_HOST, max_retries=0)
+
+
+# Function to create a session for fetching links
+def _new_session():
+    import requests
+
+    session = requests.Session()
+    session.trust_env = False  # No proxies from the environment: the connected address has to be the site's
+    adapter = _public_adapter()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": USER_AGENT, "Accept": "text/html,application/xhtml+xml,*/*;q=0.8"})
+    return session
+
+
+# Function to create the pooled session, the worker pools and the cache once per process
+def _resources():
+    global _session, _pool, _cache, _background
+    with _lock:
+        if _session is None:
+            session = _new_session()
+            _pool = ThreadPoolExecutor(max_workers=LINK_WORKERS, thread_name_prefix="link")
+            _background = ThreadPoolExecutor(max_workers=4, thread_name_prefix="link-check")
+            _cache = LinkCache()
+            _session = session
+        return _session, _pool, _cache, _background
+
+
+def _host_slot(url):
+    host = urlsplit(url).netloc.lower()
+    with _lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(LINK_MAX_PER_HOST)
+        return _host_slots[host]
+
+
+# Function to read a page's <title> from the start of an HTML response
+def _title(response):
+    from bs4 import BeautifulSoup
+
+    if "html" not in response.headers.get("Content-Type", "html"):
+        return None
+    body = b""
+    for chunk in response.iter_content(16384):
+        body += chunk
+        if len(body) >= MAX_PAGE_BYTES or b"</title>" in body.lower():
+            break
+    title = BeautifulSoup(body, "html.parser").title
+    text = " ".join(title.get_text().split()) if title else ""
+    return text or None
+
+
+# Function to fetch one URL, following redirects only to public addresses (see _public_adapter); gives up waiting
+# for a connection slot at the deadline (monotonic)
+def _fetch(session, url, deadline):
+    import requests
+
+    slot = _host_slot(url)
+    if not slot.acquire(timeout=max(0.0, deadline - time.monotonic())):
+        return LinkCheck(url, None, error="not checked in time")
+    try:
+        target = url
+        for _ in range(MAX_REDIRECTS + 1):
+            with session.get(target, timeout=(LINK_CONNECT_TIMEOUT, LINK_READ_TIMEOUT), stream=True, allow_redirects=False) as response:
+                if response.is_redirect:
+                    target = urljoin(target, response.headers["Location"])
+                    continue
+                if response.status_code >= 400:
+                    return LinkCheck(url, False, status=response.status_code)
+                return LinkCheck(url, True, status=response.status_code, title=_title(response))
+        return LinkCheck(url, False, error="too many redirects")
+    except AddressRefused as e:
+        return LinkCheck(url, False, error=str(e))
+    except requests.Timeout:
+        return LinkCheck(url, False, error="timeout")
+    except requests.ConnectionError:
+        return LinkCheck(url, False, error="unreachable")
+    except requests.RequestException as e:
+        return LinkCheck(url, False, error=type(e).__name__)
+    finally:
+        slot.release()
+
+
+# Function to check URLs concurrently within the deadline (seconds); returns {url: LinkCheck}
+def check_links(urls, deadline=LINK_DEADLINE):
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return {}
+    session, pool, cache, _ = _resources()
+    checks = cache.get_many(urls)
+    until = time.monotonic() + deadline
+    futures = {pool.submit(_fetch, session, url, until): url for url in urls if url not in checks}
+    done, _ = wait(futures, timeout=deadline)
+    for future, url in futures.items():
+        if future not in done:
+            checks[url] = LinkCheck(url, None, error="not checked in time")
+            continue
+        checks[url] = future.result()
+        if checks[url].live is not None:
+            cache.set(checks[url])
+    return checks
+
+
+# Function to start checking the links of a text in the background (e.g. while the next stage runs); returns a Future of {url: LinkCheck}
+def check_text_async(text, deadline=LINK_DEADLINE):
+    urls = extract_urls(text) if LINK_CHECK_ENABLED else []
+    return _resources()[3].submit(check_links, urls, deadline)
+
+
+# Function to show text from a fetched page literally in markdown, so a page cannot add links, images or formatting
+def _escape_markdown(text):
+    return _MARKDOWN.sub(r"\\\1", " ".join(text.split()))
+
+
+# Function to annotate every link in a text as live (with its page title) or dead, using the results of check_links
+def annotate(text, checks):
+    def mark(match):
+        link = match.group(0)
+        url = _url(match)
+        trailing = ""
+        if not match.group("md") and not match.group("angle"):
+            link, trailing = url, link[len(url):]
+        check = checks.get(url)
+        if check is None:
+            return match.group(0)
+        if check.live:
+            note = f"✅ live — “{_escape_markdown(check.title)}”" if check.title else "✅ live"
+        elif check.live is None:
+            note = "⚠️ not verified"
+        else:
+            note = f"❌ dead ({check.status or check.error})"
+        return f"{link} *({note})*{trailing}"
+
+    return _LINK.sub(mark, text)
@@ -0,0 +1,446 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import streamlit as st
+
+import cassette
+import llm_cache
+import metrics
+import rate_limiter
+import resilience
+import routing
+import singleflight
+
+# Shared OpenAI client used by all apps: one pooled keep-alive HTTP session per process,
+# consistent timeouts and retries (resilience.py), and a single complete(messages, **params) entry point.
+# openai and requests are imported on the first call rather than at page load; they are among the slowest imports.
+
+# Default request parameters; every call can override them through **params
+DEFAULT_MODEL = os.environ.get("OPENAI_MODEL", "gpt-3.5-turbo")
+REQUEST_TIMEOUT = float(os.environ.get("OPENAI_REQUEST_TIMEOUT", "60"))  # Seconds per attempt
+POOL_SIZE = int(os.environ.get("OPENAI_POOL_SIZE", "16"))  # Keep-alive connections kept open to the API
+
+# Hedging: a non-streamed call that has not answered by the historical p90 of its stage gets a duplicate request and
+# the first answer wins; a streamed call that has no first token by the p90 time to first token gets a duplicate stream
+# and the first stream to produce a token is read, the other one closed.
+# Duplicates are only sent with free rate-limit capacity and at most for HEDGE_MAX_RATE of calls.
+HEDGE_ENABLED = os.environ.get("LLM_HEDGE", "0") != "0"
+HEDGE_QUANTILE = 90
+HEDGE_MAX_RATE = float(os.environ.get("LLM_HEDGE_MAX_RATE", "0.1"))
+HEDGE_MIN_SAMPLES = 20  # Latency samples needed before a stage is hedged
+
+
+# Raised when the caller's cancel event is set (for example because the page was rerun or closed)
+class Cancelled(Exception):
+    pass
+
+
+# Raised when a call cannot finish within its deadline
+class DeadlineExceeded(Exception):
+    pass
+
+
+# Identical requests that are already in flight are shared between sessions instead of sent again;
+# a caller that cancels or runs out of time does not take the waiting callers down with it
+_in_flight = singleflight.SingleFlight()
+
+
+# Response text returned by complete(); a str that also records the model that answered
+class Completion(str):
+    def __new__(cls, text, model):
+        completion = super().__new__(cls, text)
+        completion.model = model
+        return completion
+
+
+# Function to find the OpenAI API key; the apps historically stored it under different secret paths
+def _api_key():
+    for section, name in (("general", "OPENAI_API_KEY"), ("openai", "openai_api_key")):
+        try:
+            return st.secrets[section][name]
+        except (KeyError, FileNotFoundError):
+            continue
+    if os.environ.get("OPENAI_API_KEY"):
+        return os.environ["OPENAI_API_KEY"]
+    raise RuntimeError("No OpenAI API key found in Streamlit secrets or the OPENAI_API_KEY environment variable.")
+
+
+# Function to configure the openai module with the key and the pooled session.
+# Cached as a Streamlit resource, so it runs once per process no matter how many sessions and reruns there are.
+@st.cache_resource(show_spinner=False)
+def configure():
+    import openai
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # Replayed calls never reach the API, so a replay needs no key
+    openai.api_key = _api_key() if cassette.CASSETTE_MODE != "replay" else "replay"
+    # The openai package reuses this session (and its connection pool) from every thread
+    openai.requestssession = session
+    metrics.start_exporter()
+    return session
+
+
+# Deadline, cancellation and hedging of one complete() call
+class _CallControl:
+    def __init__(self, deadline, cancel, hedge):
+        self.deadline = time.monotonic() + deadline if deadline else None  # Monotonic
+        self.cancel = cancel  # threading.Event or None
+        self.hedge = hedge
+
+    def remaining(self):
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    # Raise if the call was cancelled or ran out of time
+    def check(self):
+        if self.cancel is not None and self.cancel.is_set():
+            raise Cancelled("The call was cancelled.")
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded("The call did not finish within its deadline.")
+
+    # Per-attempt timeout: never longer than what is left of the deadline
+    def timeout(self):
+        remaining = self.remaining()
+        return REQUEST_TIMEOUT if remaining is None else max(0.1, min(REQUEST_TIMEOUT, remaining))
+
+    # Back off before the next attempt, waking up early on cancellation
+    def sleep(self, seconds):
+        remaining = self.remaining()
+        if remaining is not None and remaining <= seconds:
+            raise DeadlineExceeded("No time left within the deadline for another attempt.")
+        if self.cancel is not None:
+            self.cancel.wait(seconds)
+        else:
+            time.sleep(seconds)
+        self.check()
+
+
+# Deadline and cancellation of a call shared by coalesced callers (singleflight.py): it runs until the last attached
+# caller's deadline and is cancelled once every caller detached, not when the caller that started it gives up
+class _FlightControl(_CallControl):
+    def __init__(self, flight, hedge):
+        self.flight = flight
+        self.cancel = flight.cancel
+        self.hedge = hedge
+
+    @property
+    def deadline(self):
+        return self.flight.deadline()
+
+
+# Function to estimate the prompt tokens of a request (streams report no usage)
+def _prompt_tokens(request):
+    return sum(rate_limiter.approximate_tokens(message.get("content")) for message in request["messages"])
+
+
+# Function to open a stream and wait for its first chunk; returns the chunks and the first one (None for an empty stream)
+def _open_stream(request):
+    import openai
+
+    chunks = cassette.create(openai.ChatCompletion.create, stream=True, **request)
+    try:
+        return chunks, next(chunks, None)
+    except BaseException:
+        chunks.close()
+        raise
+
+
+# Function to read an opened stream to the end, passing every token to on_token; returns the text and estimated usage
+def _read_stream(request, chunks, first, on_token, control):
+    text = ""
+    try:
+        chunk = first
+        while chunk is not None:
+            token = chunk.choices[0].delta.get('content', '')
+            text += token
+            on_token(token)
+            control.check()
+            chunk = next(chunks, None)
+    finally:
+        chunks.close()
+    return text, (_prompt_tokens(request), rate_limiter.approximate_tokens(text))
+
+
+# Function to send one request, streaming tokens to on_token when it is given.
+# Returns the text and the (prompt, completion) token usage; streams report no usage, so it is estimated from the text.
+# A stream is closed as soon as the call is cancelled or out of time. Requests go through the cassette (cassette.py),
+# which passes them on to the API unless LLM_CASSETTE_MODE records or replays them.
+def _create(request, on_token, control):
+    import openai
+
+    if on_token is None:
+        response = cassette.create(openai.ChatCompletion.create, **request)
+        usage = response.get("usage") or {}
+        text = response.choices[0].message['content']
+        return text, (usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+
+    return _read_stream(request, *_open_stream(request), on_token, control)
+
+
+class _HedgeBudget:
+    def __init__(self, max_rate):
+        self.max_rate = max_rate
+        self.calls = 0
+        self.hedges = 0
+        self._lock = threading.Lock()
+
+    def count_call(self):
+        with self._lock:
+            self.calls += 1
+
+    # Reserve a hedge if that keeps hedges within max_rate of the calls seen so far
+    def allow(self):
+        with self._lock:
+            if self.hedges + 1 > self.max_rate * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+
+_hedges = _HedgeBudget(HEDGE_MAX_RATE)
+_hedge_pool = ThreadPoolExecutor(max_workers=2 * POOL_SIZE, thread_name_prefix="llm-hedge")
+
+
+# Function to send a non-streamed request and, if it is slower than the stage's p90, a duplicate; the first answer wins
+def _create_hedged(request, call, control, limiter, estimated_tokens):
+    delay = metrics.registry.quantile("upstream_latency", HEDGE_QUANTILE, app=call.app, stage=call.stage,
+                                      model=request["model"], min_samples=HEDGE_MIN_SAMPLES)
+    if delay is None:
+        return _create(request, None, control)
+    _hedges.count_call()
+    first = _hedge_pool.submit(_create, request, None, control)
+    remaining = control.remaining()
+    done, _ = wait([first], timeout=delay if remaining is None else max(0.0, min(delay, remaining)))
+    if done or not _hedges.allow() or not limiter.try_acquire(estimated_tokens):
+        return first.result()
+
+    call.hedged = True
+    second = _hedge_pool.submit(_create, request, None, control)
+
+    # The duplicate took its own rate-limit capacity; correct it with its own usage (none when it failed)
+    def settle_duplicate(future):
+        limiter.settle(estimated_tokens, sum(future.result()[1]) if future.exception() is None else 0)
+
+    second.add_done_callback(settle_duplicate)
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = error or future.exception()
+    raise error
+
+
+# Function to open a stream and, if it has no first token by the stage's p90 time to first token, a duplicate;
+# the stream that produces a token first is read to the end and the other one is closed as soon as it opens
+def _create_hedged_stream(request, on_token, call, control, limiter, estimated_tokens):
+    delay = metrics.registry.quantile("first_token", HEDGE_QUANTILE, app=call.app, stage=call.stage,
+                                      model=request["model"], min_samples=HEDGE_MIN_SAMPLES)
+    if delay is None:
+        return _create(request, on_token, control)
+    _hedges.count_call()
+    first = _hedge_pool.submit(_open_stream, request)
+    remaining = control.remaining()
+    done, _ = wait([first], timeout=delay if remaining is None else max(0.0, min(delay, remaining)))
+    if done or not _hedges.allow() or not limiter.try_acquire(estimated_tokens):
+        return _read_stream(request, *first.result(), on_token, control)
+
+    call.hedged = True
+    second = _hedge_pool.submit(_open_stream, request)
+
+    # The duplicate took its own rate-limit capacity; the losing stream is charged for its prompt (nothing when it failed)
+    def close_loser(future):
+        opened = future.exception() is None
+        if opened:
+            future.result()[0].close()
+        limiter.settle(estimated_tokens, _prompt_tokens(request) if opened else 0)
+
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                (second if future is first else first).add_done_callback(close_loser)
+                return _read_stream(request, *future.result(), on_token, control)
+            error = error or future.exception()
+    limiter.settle(estimated_tokens, 0)
+    raise error
+
+
+# Function to decide whether a request may be answered with a response produced for an identical request
+# (from the on-disk cache or from an identical call that is still in flight)
+def _shareable(request, cache):
+    if cache is not None:
+        return cache
+    # The API samples with temperature 1 unless told otherwise
+    return request.get("temperature", 1) == 0 or llm_cache.CACHE_SAMPLED
+
+
+# Function to call the API through the model's shared rate limiter and circuit breaker, retrying rate limits and
+# transient errors (full-jitter backoff, within the model's retry budget); fatal errors are raised straight away.
+# Raises resilience.CircuitOpen without calling the API while the model's circuit is open.
+# Queue wait, upstream latency, token usage and retries are recorded on call.
+def _complete_upstream(request, on_token, call, control):
+    started = False
+    streamed = ""  # Text of a stream so far, to settle the rate limiter for a stream that is cut off
+
+    def on_token_started(token):
+        nonlocal started, streamed
+        if not started:
+            call.first_token = time.monotonic() - attempt_started
+        started = True
+        streamed += token
+        on_token(token)
+
+    limiter = rate_limiter.get_limiter(request["model"])
+    breaker = resilience.get_breaker(request["model"])
+    budget = resilience.get_budget(request["model"])
+    budget.record_call()
+    estimated_tokens = rate_limiter.estimate_tokens(request)
+    for attempt in range(resilience.MAX_ATTEMPTS):
+        call.retries = attempt
+        control.check()
+        breaker.before_call()
+        try:
+            call.queue_wait += limiter.acquire(estimated_tokens, control.deadline, control.cancel)
+        except TimeoutError:
+            control.check()
+            raise DeadlineExceeded("The call did not get through the rate limiter within its deadline.")
+        attempt_started = time.monotonic()
+        attempt_request = dict(request, request_timeout=control.timeout())
+        try:
+            if control.hedge and on_token is None:
+                text, usage = _create_hedged(attempt_request, call, control, limiter, estimated_tokens)
+            elif control.hedge:
+                text, usage = _create_hedged_stream(attempt_request, on_token_started, call, control, limiter, estimated_tokens)
+            else:
+                text, usage = _create(attempt_request, on_token_started if on_token else None, control)
+            call.prompt_tokens, call.completion_tokens = usage
+            call.latency = time.monotonic() - attempt_started
+            limiter.settle(estimated_tokens, call.prompt_tokens + call.completion_tokens)
+            breaker.record_success()
+            return text.strip()
+        except Exception as e:
+            call.latency = time.monotonic() - attempt_started
+            # A failed request is not charged; a stream cut off after some tokens is charged for what it produced
+            used = 0
+            if started:
+                used = _prompt_tokens(request) + rate_limiter.approximate_tokens(streamed)
+            limiter.settle(estimated_tokens, used)
+            kind = resilience.classify(e)
+            if kind == resilience.FATAL:
+                raise
+            if kind == resilience.TRANSIENT:
+                breaker.record_failure()  # Rate limits are a quota matter, not a sign of an unhealthy model
+            # A stream that already produced tokens cannot be retried without duplicating output
+            if started or attempt == resilience.MAX_ATTEMPTS - 1 or not budget.try_retry():
+                # A call that failed because its model went down is handed on like any call to an open circuit
+                circuit = breaker.open_error() if kind == resilience.TRANSIENT and not started else None
+                if circuit is not None:
+                    raise circuit from e
+                raise
+            if kind == resilience.RATE_LIMITED:
+                # Pause the shared queue so every session waits once, honoring Retry-After when the API sends it
+                limiter.pause(rate_limiter.retry_after(e) or resilience.backoff(attempt))
+            else:
+                control.sleep(resilience.backoff(attempt))
+
+
+# Function to answer a request from the cache, an identical in-flight call or upstream
+def _complete(request, on_token, cache, call, control):
+    if not _shareable(request, cache):
+        return _complete_upstream(request, on_token, call, control)
+
+    key = llm_cache.cache_key(request)
+    response_cache = llm_cache.get_cache()
+    if response_cache is not None:
+        text = response_cache.get(key)
+        if text is not None:
+            call.cache = "hit"
+            if on_token:
+                on_token(text)
+            return text
+
+    def fetch(publish, flight):
+        call.cache = "miss"
+        text = _complete_upstream(request, publish, call, _FlightControl(flight, control.hedge))
+        # Store before the flight ends so later callers find the response in the cache
+        if response_cache is not None:
+            response_cache.set(key, text)
+        return text
+
+    # Stays "coalesced" unless this call ends up leading the flight
+    call.cache = "coalesced"
+    try:
+        return _in_flight.do(key, fetch, on_token, control.deadline, control.cancel)
+    except TimeoutError:
+        control.check()
+        raise DeadlineExceeded("The call did not finish within its deadline.")
+
+
+# Function to answer a call whose model's circuit is open: with a cached response to the same request (even when
+# fresh output was asked for, which beats no answer), else with the route's fallback model; returns (text, model)
+def _hand_off(request, on_token, cache, call, control, route, error):
+    response_cache = llm_cache.get_cache()
+    text = response_cache.get(llm_cache.cache_key(request)) if response_cache is not None else None
+    if text is not None:
+        call.cache, call.handoff = "hit", "cache"
+        if on_token:
+            on_token(text)
+        return text, request["model"]
+    fallback = route[1] if route else None
+    if fallback is None or fallback == request["model"] or resilience.get_breaker(fallback).state() == "open":
+        raise error
+    call.model, call.handoff = fallback, "fallback"
+    return _complete(dict(request, model=fallback), on_token, cache, call, control), fallback
+
+
+# Function to run a chat completion and return the response text (a Completion, whose .model is the model that answered).
+# With on_token the response is streamed and on_token is called with every token as it arrives.
+# Identical requests are answered from the on-disk cache or joined while in flight; pass cache=False when fresh output is required.
+# app and stage label the call in the metrics and, unless a model or deadline is passed, pick them through routing.py.
+# deadline (seconds) bounds the whole call including queueing and retries; setting the cancel event (a threading.Event)
+# stops it between attempts and streamed tokens. hedge overrides LLM_HEDGE.
+# While a model's circuit is open (resilience.py) the call is handed to the cache or the route's fallback model,
+# or fails fast with resilience.CircuitOpen.
+def complete(messages, on_token=None, cache=None, app=None, stage=None, deadline=None, cancel=None, hedge=None, **params):
+    configure()
+    model = params.pop("model", None) or routing.choose_model(app, stage, DEFAULT_MODEL)
+    request = {"model": model, "request_timeout": REQUEST_TIMEOUT, **params, "messages": messages}
+    control = _CallControl(deadline or routing.get_deadline(app, stage), cancel, HEDGE_ENABLED if hedge is None else hedge)
+    call = metrics.CallRecord(app, stage, model)
+    try:
+        try:
+            return Completion(_complete(request, on_token, cache, call, control), model)
+        except resilience.CircuitOpen as e:
+            return Completion(*_hand_off(request, on_token, cache, call, control, routing.get_route(app, stage), e))
+    except Exception as e:
+        call.error = type(e).__name__
+        raise
+    finally:
+        call.duration = time.monotonic() - call.started
+        metrics.record(call)
+
+
+# Function to stream a completion into a Streamlit placeholder and return the final text
+def complete_into(placeholder, messages, **params):
+    text = ""
+
+    def on_token(token):
+        nonlocal text
+        text += token
+        placeholder.markdown(text + "▌")
+
+    result = complete(messages, on_token=on_token, **params)
+    placeholder.markdown(result)
+    return result
@@ -0,0 +1,261 @@
+import bisect
+import collections
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Per-call instrumentation for LLM requests. llm_client records one CallRecord per completion; this module keeps
+# cumulative counters and histograms for Prometheus plus a rolling window of samples for live percentiles
+# (used by the admin page and by anything that needs current latency, such as routing decisions).
+
+# USD per 1K prompt / completion tokens, used for cost estimates
+PRICES = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-turbo": (0.01, 0.03),
+}
+LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120]  # Seconds
+WINDOW_SECONDS = float(os.environ.get("METRICS_WINDOW", "600"))  # Rolling window for percentiles
+WINDOW_SAMPLES = 5000  # Per series
+RECENT_CALLS = 200
+
+METRICS_FILE = os.environ.get("METRICS_FILE")  # Prometheus text file, rewritten at most every METRICS_FILE_INTERVAL seconds
+METRICS_FILE_INTERVAL = 5.0
+METRICS_PORT = os.environ.get("METRICS_PORT")  # Serve /metrics on this port when set
+
+
+class CallRecord:
+    def __init__(self, app, stage, model):
+        self.app = app or "unknown"
+        self.stage = stage or "unknown"
+        self.model = model
+        self.started = time.monotonic()
+        self.timestamp = time.time()
+        self.duration = 0.0  # Whole call as seen by the page, including queueing and retries
+        self.queue_wait = 0.0  # Time spent waiting for the rate limiter
+        self.latency = 0.0  # Upstream time of the attempt that answered
+        self.first_token = None  # Upstream time to the first streamed token of that attempt (streamed calls only)
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cache = "bypass"  # hit, miss, coalesced or bypass
+        self.retries = 0
+        self.hedged = False  # A duplicate request was sent to cut tail latency
+        self.handoff = None  # "cache" or "fallback" when the model's circuit was open
+        self.error = None
+
+    @property
+    def cost(self):
+        prompt_price, completion_price = PRICES.get(self.model, (0.0, 0.0))
+        return (self.prompt_tokens * prompt_price + self.completion_tokens * completion_price) / 1000.0
+
+    def as_dict(self):
+        return {
+            "time": self.timestamp, "app": self.app, "stage": self.stage, "model": self.model,
+            "duration_s": self.duration, "queue_wait_s": self.queue_wait, "upstream_latency_s": self.latency,
+            "first_token_s": self.first_token,
+            "prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens,
+            "cost_usd": self.cost, "cache": self.cache, "retries": self.retries, "hedged": self.hedged,
+            "handoff": self.handoff, "error": self.error,
+        }
+
+
+class RollingHistogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)  # Cumulative since start, last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.window = collections.deque(maxlen=WINDOW_SAMPLES)  # (monotonic time, value)
+
+    def observe(self, value, now):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.window.append((now, value))
+
+    def recent(self, now):
+        while self.window and now - self.window[0][0] > WINDOW_SECONDS:
+            self.window.popleft()
+        return [value for _, value in self.window]
+
+
+# Function to compute a percentile (nearest rank) of a list of samples, or None without samples
+def percentile(samples, q):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100.0 * len(ordered) + 0.5)) - 1))]
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}  # (metric, app, stage, model) -> RollingHistogram
+        self.counters = collections.defaultdict(float)  # (metric, labels tuple) -> value
+        self.recent_calls = collections.deque(maxlen=RECENT_CALLS)
+        self.outcomes = {}  # model -> deque of (monotonic time, error name or None) for rolling error rates
+        self._file_written = 0.0
+
+    def record(self, call):
+        now = time.monotonic()
+        series = (call.app, call.stage, call.model)
+        with self._lock:
+            observed = (("duration", call.duration), ("queue_wait", call.queue_wait), ("upstream_latency", call.latency), ("first_token", call.first_token))
+            for metric, value in observed:
+                if metric in ("upstream_latency", "first_token") and call.cache not in ("miss", "bypass"):
+                    continue  # Answered without an upstream request
+                if value is None:
+                    continue
+                key = (metric,) + series
+                if key not in self.histograms:
+                    self.histograms[key] = RollingHistogram()
+                self.histograms[key].observe(value, now)
+            self.counters[("calls", series + (call.cache, "error" if call.error else "ok"))] += 1
+            # A cancelled call, or one that never reached the model because its circuit was open, says nothing about the model
+            if call.cache in ("miss", "bypass") and call.error not in ("Cancelled", "CircuitOpen"):
+                self.outcomes.setdefault(call.model, collections.deque(maxlen=WINDOW_SAMPLES)).append((now, call.error))
+            self.counters[("prompt_tokens", series)] += call.prompt_tokens
+            self.counters[("completion_tokens", series)] += call.completion_tokens
+            self.counters[("cost_usd", series)] += call.cost
+            self.counters[("retries", series)] += call.retries
+            self.counters[("hedges", series)] += call.hedged
+            self.counters[("handoffs", series)] += call.handoff is not None
+            self.recent_calls.append(call.as_dict())
+            write_file = METRICS_FILE and now - self._file_written >= METRICS_FILE_INTERVAL
+            if write_file:
+                self._file_written = now
+        if write_file:
+            self.write_file(METRICS_FILE)
+
+    # Rolling-window percentile of a metric over every series matching the given labels (None below min_samples)
+    def quantile(self, metric, q, app=None, stage=None, model=None, min_samples=1):
+        now = time.monotonic()
+        samples = []
+        with self._lock:
+            for (name, series_app, series_stage, series_model), histogram in self.histograms.items():
+                if name != metric or (app and app != series_app) or (stage and stage != series_stage) or (model and model != series_model):
+                    continue
+                samples.extend(histogram.recent(now))
+        return percentile(samples, q) if len(samples) >= min_samples else None
+
+    # Rolling-window share of a model's upstream calls that failed (None below min_samples)
+    def error_rate(self, model, min_samples=1):
+        now = time.monotonic()
+        with self._lock:
+            outcomes = self.outcomes.get(model)
+            while outcomes and now - outcomes[0][0] > WINDOW_SECONDS:
+                outcomes.popleft()
+            if not outcomes or len(outcomes) < min_samples:
+                return None
+            return sum(1 for _, error in outcomes if error) / len(outcomes)
+
+    # Rows of per-(app, stage, model) aggregates for the admin page
+    def summary(self):
+        now = time.monotonic()
+        rows = {}
+        with self._lock:
+            for (metric, app, stage, model), histogram in self.histograms.items():
+                row = rows.setdefault((app, stage, model), {"app": app, "stage": stage, "model": model})
+                recent = histogram.recent(now)
+                row[f"{metric}_p50_s"] = percentile(recent, 50)
+                row[f"{metric}_p95_s"] = percentile(recent, 95)
+            for (metric, labels), value in self.counters.items():
+                row = rows.setdefault(labels[:3], {"app": labels[0], "stage": labels[1], "model": labels[2]})
+                if metric == "calls":
+                    row["calls"] = row.get("calls", 0) + value
+                    row[f"cache_{labels[3]}"] = row.get(f"cache_{labels[3]}", 0) + value
+                    if labels[4] == "error":
+                        row["errors"] = row.get("errors", 0) + value
+                else:
+                    row[metric] = value
+        return list(rows.values())
+
+    # Prometheus text exposition format
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            names = {
+                "calls": ("llm_calls_total", "Completion calls by cache outcome and status"),
+                "prompt_tokens": ("llm_prompt_tokens_total", "Prompt tokens sent"),
+                "completion_tokens": ("llm_completion_tokens_total", "Completion tokens received"),
+                "cost_usd": ("llm_cost_usd_total", "Estimated cost in USD"),
+                "retries": ("llm_retries_total", "Retried attempts"),
+                "hedges": ("llm_hedges_total", "Duplicate requests sent to cut tail latency"),
+                "handoffs": ("llm_handoffs_total", "Calls answered by the cache or a fallback model while the circuit was open"),
+            }
+            for metric, (name, help_text) in names.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for (counter, labels), value in sorted(self.counters.items()):
+                    if counter != metric:
+                        continue
+                    label_text = _labels(labels[0], labels[1], labels[2])
+                    if metric == "calls":
+                        label_text = label_text[:-1] + f',cache="{labels[3]}",status="{labels[4]}"}}'
+                    lines.append(f"{name}{label_text} {value:g}")
+            for metric in ("duration", "queue_wait", "upstream_latency", "first_token"):
+                name = f"llm_{metric}_seconds"
+                lines += [f"# HELP {name} LLM call {metric.replace('_', ' ')} in seconds", f"# TYPE {name} histogram"]
+                for (histogram_metric, app, stage, model), histogram in sorted(self.histograms.items()):
+                    if histogram_metric != metric:
+                        continue
+                    base = _labels(app, stage, model)[1:-1]
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ["+Inf"], histogram.bucket_counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{base},le="{bound}"}} {cumulative}')
+                    lines.append(f"{name}_sum{{{base}}} {histogram.sum:g}")
+                    lines.append(f"{name}_count{{{base}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path):
+        text = self.render_prometheus()
+        temporary = path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temporary, path)  # Scrapers never see a half-written file
+
+
+def _labels(app, stage, model):
+    return f'{{app="{app}",stage="{stage}",model="{model}"}}'
+
+
+registry = Registry()
+
+
+# Function to record a finished call in the process-wide registry
+def record(call):
+    registry.record(call)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_server_lock = threading.Lock()
+_server = None
+
+
+# Function to start the /metrics endpoint once per process when METRICS_PORT is set
+def start_exporter():
+    global _server
+    if not METRICS_PORT:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(("0.0.0.0", int(METRICS_PORT)), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
@@ -0,0 +1,204 @@
+import argparse
+import html
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Local stand-in for the OpenAI ChatCompletion endpoint, for measuring the apps offline.
+# Latency is drawn from a configurable distribution, a share of requests can be answered with 429s or 503s
+# (or every request to some models with 503s, to simulate a degraded model), and stream=True requests are answered as server-sent events token by token.
+# GET /pages/<status>?title=...&delay=...&location=... serves a small HTML page, as a stand-in for the links in answers.
+#
+#   python mock_openai.py --port 8800 --latency lognormal:1.5:0.5 --rate-limit 0.05
+#   OPENAI_API_BASE=http://127.0.0.1:8800/v1 streamlit run transformer.py
+
+
+# Function to parse a latency distribution: "fixed:S", "uniform:LOW:HIGH", "normal:MEAN:STDDEV" or "lognormal:MEDIAN:SIGMA" (seconds)
+def parse_latency(spec):
+    kind, *values = spec.split(":")
+    values = [float(value) for value in values]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda: values[0] * random.lognormvariate(0.0, values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class MockSettings:
+    def __init__(self, latency="fixed:0.5", token_delay=0.01, reply_tokens=200, rate_limit=0.0, retry_after=1.0, error_rate=0.0, fail_models=()):
+        self.latency = parse_latency(latency)  # Time to the full response, or to the first token when streaming
+        self.token_delay = token_delay  # Seconds between streamed tokens
+        self.reply_tokens = reply_tokens
+        self.rate_limit = rate_limit  # Share of requests answered with a 429
+        self.retry_after = retry_after
+        self.error_rate = error_rate  # Share of requests answered with a 503
+        self.fail_models = set(fail_models)  # Models whose requests all fail with a 503
+        self.requests = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def count(self, rate_limited, failed=False):
+        with self._lock:
+            self.requests += 1
+            self.rate_limited += rate_limited
+            self.errors += failed
+
+
+# Function to build a deterministic reply of the configured length for a request
+def reply_tokens(request, count):
+    prompt = request["messages"][-1]["content"]
+    words = prompt.split() or ["ok"]
+    return [words[i % len(words)] + " " for i in range(count)]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+    settings = MockSettings()
+
+    def log_message(self, format, *args):
+        pass
+
+    # Clients that time out or cancel a stream close the connection mid-response; that is expected here
+    def handle_one_request(self):
+        try:
+            super().handle_one_request()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    # A page for link checks: /pages/404 answers with that status, title sets the <title>, delay (seconds) slows it down
+    # and location sets a Location header (e.g. /pages/302?location=...)
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        parts = url.path.strip("/").split("/")
+        if len(parts) != 2 or parts[0] != "pages" or not parts[1].isdigit():
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+        time.sleep(float(query.get("delay", 0)))
+        title = html.escape(query.get("title", f"Page {parts[1]}"))
+        body = f"<!DOCTYPE html><html><head><title>{title}</title></head><body><p>{title}</p></body></html>".encode("utf-8")
+        self.send_response(int(parts[1]))
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if "location" in query:
+            self.send_header("Location", query["location"])
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+
+        settings = self.settings
+        model = request.get("model", "gpt-3.5-turbo")
+        rate_limited = random.random() < settings.rate_limit
+        failed = not rate_limited and (model in settings.fail_models or random.random() < settings.error_rate)
+        settings.count(rate_limited, failed)
+        if rate_limited:
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached (mock).", "type": "requests", "code": "rate_limit_exceeded"}},
+                {"Retry-After": str(settings.retry_after)},
+            )
+            return
+        if failed:
+            time.sleep(settings.latency())
+            self._send_json(503, {"error": {"message": "The server is overloaded (mock).", "type": "server_error"}})
+            return
+
+        tokens = reply_tokens(request, min(settings.reply_tokens, request.get("max_tokens") or settings.reply_tokens))
+        prompt_tokens = sum(len((message.get("content") or "").split()) for message in request.get("messages", []))
+        completion_id = "chatcmpl-mock-" + uuid.uuid4().hex[:12]
+        time.sleep(settings.latency())
+
+        if not request.get("stream"):
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        deltas = [{"role": "assistant"}] + [{"content": token} for token in tokens] + [{}]
+        for index, delta in enumerate(deltas):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": "stop" if index == len(deltas) - 1 else None}],
+            }
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+            if delta.get("content"):
+                time.sleep(settings.token_delay)
+        self._write_chunk("data: [DONE]\n\n")
+        self._write_chunk("")
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+# Function to start the mock server in a background thread; returns the server and its OpenAI api_base URL
+def start_server(settings=None, host="127.0.0.1", port=0):
+    handler = type("ConfiguredMockHandler", (MockHandler,), {"settings": settings or MockSettings()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the OpenAI ChatCompletion API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", default="fixed:0.5", help="fixed:S, uniform:LOW:HIGH, normal:MEAN:STDDEV or lognormal:MEDIAN:SIGMA (seconds)")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between streamed tokens")
+    parser.add_argument("--reply-tokens", type=int, default=200, help="Tokens per reply (capped by max_tokens)")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Share of requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 503")
+    parser.add_argument("--fail-model", action="append", default=[], help="Answer every request to this model with a 503 (repeatable)")
+    args = parser.parse_args(argv)
+
+    settings = MockSettings(args.latency, args.token_delay, args.reply_tokens, args.rate_limit, args.retry_after, args.error_rate, args.fail_model)
+    server, api_base = start_server(settings, args.host, args.port)
+    print(f"Mock OpenAI API listening on {api_base}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
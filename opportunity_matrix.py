@@ -0,0 +1,58 @@
+import io
+
+import streamlit as st
+
+# Opportunity matrix for a whole portfolio of analysed problems. All opportunities go into a single Vega-Lite
+# scatter that the browser renders (with hover labels), so a rerun only ships the points instead of drawing a
+# figure on the server, and parsed batch results are cached keyed on the uploaded file's content.
+
+MATRIX_SPEC = {
+    "mark": {"type": "circle", "size": 90, "opacity": 0.7},
+    "encoding": {
+        "x": {"field": "challenge", "type": "quantitative", "title": "Challenges (Lower is Better)", "scale": {"domain": [0, 10]}},
+        "y": {"field": "potential", "type": "quantitative", "title": "Market Potential (Higher is Better)", "scale": {"domain": [0, 10]}},
+        "color": {"field": "source", "type": "nominal", "title": "Source"},
+        "tooltip": [
+            {"field": "label", "type": "nominal", "title": "Opportunity"},
+            {"field": "potential", "type": "quantitative", "title": "Market Potential", "format": ".1f"},
+            {"field": "challenge", "type": "quantitative", "title": "Challenges", "format": ".1f"},
+        ],
+    },
+}
+LABEL_LENGTH = 80
+
+
+# Function to describe one analysed problem as a point of the matrix (scores on a scale of 1-10)
+def opportunity(label, potential_score, challenge_score, source="This session"):
+    label = " ".join(str(label).split())
+    if len(label) > LABEL_LENGTH:
+        label = label[:LABEL_LENGTH - 3] + "..."
+    return {
+        "label": label,
+        "potential": min(10.0, max(0.0, float(potential_score))),
+        "challenge": min(10.0, max(0.0, float(challenge_score))),
+        "source": source,
+    }
+
+
+# Function to read the scored rows of a batch.py results file; cached on the file content so reruns skip the parsing
+@st.cache_data(show_spinner=False, max_entries=8)
+def load_batch_opportunities(data, source="Batch results"):
+    import pandas as pd
+
+    frame = pd.read_json(io.BytesIO(data), lines=True, dtype=False)
+    if frame.empty or not {"potential_score", "challenge_score"} <= set(frame.columns):
+        return []
+    potential = pd.to_numeric(frame["potential_score"], errors="coerce")
+    challenge = pd.to_numeric(frame["challenge_score"], errors="coerce")
+    scored = potential.notna() & challenge.notna()
+    labels = frame["problem"] if "problem" in frame.columns else frame.index.astype(str)
+    return [
+        opportunity(label, potential_score, challenge_score, source)
+        for label, potential_score, challenge_score in zip(labels[scored], potential[scored], challenge[scored])
+    ]
+
+
+# Function to plot all opportunities on one matrix
+def plot_opportunity_matrix(opportunities):
+    st.vega_lite_chart({**MATRIX_SPEC, "data": {"values": opportunities}, "title": "Opportunity Matrix", "height": 420})
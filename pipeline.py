@@ -0,0 +1,109 @@
+import importlib
+import os
+import re
+
+import streamlit as st
+
+import jobs
+
+# Pipeline mode of the multipage app (app.py): the tools are chained proban -> ideas -> compt -> lean. What a tool
+# found is handed to the next one through the session (the problem, who is affected, the chosen solution), and the
+# next tool's job is started speculatively as soon as its inputs are known, while the user is still reading. When
+# the user opens the next page its inputs are filled in and its job is already running or done. If the user edits
+# the inputs and runs the tool again, the identical calls are answered from the response cache or joined in flight.
+
+PIPELINE_PREFETCH = os.environ.get("PIPELINE_PREFETCH", "1") != "0"  # Start the next tool before it is opened
+
+# kind -> (module with run_job, page script, page title, job key in the session); in pipeline order
+STAGES = {
+    "proban": ("proban", "proban.py", "Problem Analyser", "proban_job"),
+    "ideas": ("ideagenerator", "ideagenerator.py", "Innovative Solution Generator", "ideas_job"),
+    "compt": ("compt", "compt.py", "Competitor Analysis", "compt_job"),
+    "lean": ("lean", "lean.py", "Startup Idea Validator", "lean_job"),
+}
+CHAIN = list(STAGES)
+
+# A top-level numbered solution: "1.", "**1.", "### 1)", "Solution 1:", ...
+_SOLUTION = re.compile(r"^(?:#{1,6}\s*)?(?:\*\*)?\s*(?:Solution\s*)?(?P<number>\d{1,2})\s*[.:)]", re.IGNORECASE | re.MULTILINE)
+_MARKUP = re.compile(r"[*_`#]+")
+
+
+# Function to render the pipeline mode switch (in the app's sidebar)
+def mode_toggle():
+    st.sidebar.toggle(
+        "Pipeline mode",
+        key="pipeline_mode",
+        help="Carry each tool's results into the next one (Problem Analyser → Solutions → Competitors → Validation) and start the next tool in the background.",
+    )
+
+
+def enabled():
+    return bool(st.session_state.get("pipeline_mode"))
+
+
+# Function to get a value handed over by an earlier tool, e.g. value("problem"), or default outside pipeline mode
+def value(name, default=""):
+    if not enabled():
+        return default
+    return st.session_state.get("pipeline", {}).get(name) or default
+
+
+# Function to build the job params of a tool from the handed-over values, or None while some are missing
+def next_params(kind):
+    handoff = st.session_state.get("pipeline", {})
+    if kind == "ideas":
+        params = {"problem_description": handoff.get("problem"), "target_audience": handoff.get("audience")}
+    elif kind == "compt":
+        params = {"solution_description": handoff.get("solution")}
+    elif kind == "lean":
+        params = {"problem_description": handoff.get("problem"), "solution_description": handoff.get("solution"), "customer_segments": handoff.get("audience")}
+    else:
+        return None
+    return params if all(params.values()) else None
+
+
+# Function to start a tool's job unless the session already tracks a job with the same params.
+# A speculative job for other params (say, another solution was picked) is cancelled if it is still running.
+def prefetch(kind):
+    params = next_params(kind)
+    if params is None or not PIPELINE_PREFETCH:
+        return
+    module, _, _, job_key = STAGES[kind]
+    current = jobs.get(jobs.tracked(job_key)) if jobs.tracked(job_key) else None
+    if current is not None and current["params"] == params and current["status"] != "failed":
+        return
+    # The page of the next tool may not have been opened in this process yet, so its runner is registered here
+    jobs.register(kind, importlib.import_module(module).run_job)
+    jobs.start(job_key, kind, params)
+
+
+# Function to hand a finished tool's results to the next tool, start that tool and link to its page (pipeline mode only)
+def advance(kind, **values):
+    if not enabled():
+        return
+    st.session_state.setdefault("pipeline", {}).update({name: text for name, text in values.items() if text})
+    position = CHAIN.index(kind)
+    if position + 1 == len(CHAIN):
+        return
+    next_kind = CHAIN[position + 1]
+    prefetch(next_kind)
+    _, page, title, _ = STAGES[next_kind]
+    st.page_link(page, label=f"Next: {title}", icon="➡️")
+
+
+# Function to split a list of numbered solutions into one text per solution (the whole text when it is not numbered)
+def split_solutions(text):
+    starts, expected = [], 1
+    for match in _SOLUTION.finditer(text or ""):
+        if int(match.group("number")) == expected:
+            starts.append(match.start())
+            expected += 1
+    if len(starts) < 2:
+        return [text.strip()] if text and text.strip() else []
+    return [text[start:end].strip() for start, end in zip(starts, starts[1:] + [len(text)])]
+
+
+# Function to get a one-line label of a solution, for choosing which one is carried forward
+def solution_label(solution, width=90):
+    line = " ".join(_MARKUP.sub("", solution.splitlines()[0]).split())
+    return line if len(line) <= width else line[:width - 1] + "…"
@@ -0,0 +1,226 @@
+import streamlit as st
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import jobs
+import llm_client
+import semantic_index
+from opportunity_matrix import load_batch_opportunities, opportunity, plot_opportunity_matrix
+from scoring import parse_score, strip_scores
+
+# The problem-analysis pipeline shared by the Trend to Opportunity Transformer (transformer.py) and the Problem
+# Analyser (proban.py). The two apps only differ in their prompts (analysis_tasks) and page text; the concurrent
+# calls, the background job, the semantic index lookup, the opportunity matrix and the page itself live here,
+# parameterised by the app name, which labels the calls, the job and the semantic index.
+
+# Maximum number of analysis prompts sent to OpenAI at the same time
+MAX_CONCURRENT_CALLS = int(os.environ.get("MAX_CONCURRENT_CALLS", "4"))
+
+# Subheaders of the analysis sections, in the order of an app's analysis_tasks
+ANALYSIS_SECTIONS = [
+    "Problem Summary with Insights",
+    "Empirical Evidence and Data-Driven Arguments",
+    "Market Potential Analysis",
+    "Challenges Analysis",
+]
+# Stage names of the same sections, used to label the calls in the metrics and the outputs of a job
+ANALYSIS_STAGES = ["summary", "evidence", "potential", "challenges"]
+INPUT_FIELDS = ["problem", "barrier", "affected", "wish"]
+
+# Function to call the OpenAI API through the shared client (retries, model routing and the stage deadline included);
+# with on_token the response is streamed token by token, and setting cancel stops the call
+def make_api_call(app, prompt, system_message, on_token=None, stage=None, cancel=None):
+    return llm_client.complete(
+        [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": prompt}
+        ],
+        on_token=on_token,
+        app=app,
+        stage=stage,
+        cancel=cancel
+    )
+
+# Function to run an app's analysis tasks, (prompt, system message) pairs, concurrently (bounded by MAX_CONCURRENT_CALLS)
+# and yield (index, text, done) as they progress.
+# Without streaming only the finished responses are yielded; with streaming the partial text is yielded after every token.
+# Calls still running when the generator is closed (an error, or the page was rerun or left) are cancelled.
+def agent_interactions_as_completed(app, tasks, stream=False):
+    events = queue.Queue()
+    cancel = threading.Event()
+
+    def run_task(index, prompt, system_message):
+        try:
+            on_token = None
+            if stream:
+                partial = []
+
+                def on_token(token):
+                    partial.append(token)
+                    events.put((index, "".join(partial), False))
+
+            events.put((index, make_api_call(app, prompt, system_message, on_token, ANALYSIS_STAGES[index], cancel), True))
+        except Exception as e:
+            events.put((index, e, None))
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(MAX_CONCURRENT_CALLS, len(tasks))))
+    try:
+        for index, (prompt, system_message) in enumerate(tasks):
+            executor.submit(run_task, index, prompt, system_message)
+
+        # Worker threads only report through the queue; all rendering stays on the Streamlit script thread
+        remaining = len(tasks)
+        while remaining:
+            index, text, done = events.get()
+            if done is None:
+                raise text
+            if done:
+                remaining -= 1
+            yield index, text, done
+    finally:
+        # Do not keep paying for the remaining calls if one of them failed or nobody is waiting for them any more
+        cancel.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+# Function to simulate agents' work; returns the analyses in their original order
+def agent_interactions(app, tasks):
+    responses = [None] * len(tasks)
+    for index, text, done in agent_interactions_as_completed(app, tasks):
+        responses[index] = text
+    return tuple(responses)
+
+# Function (button callback) to skip the semantic index on the next run and analyse the problem again
+def request_fresh_analysis():
+    st.session_state["run_fresh_analysis"] = True
+
+# Function to run an app's analyses as a background job (see jobs.py) and store them for the semantic index;
+# analysis_tasks builds the app's tasks from the problem, barrier, affected and wish inputs
+def run_job(app, analysis_tasks, params, progress):
+    inputs = {field: params[field] for field in INPUT_FIELDS}
+    responses = [None] * len(ANALYSIS_SECTIONS)
+    for index, text, done in agent_interactions_as_completed(app, analysis_tasks(*inputs.values()), stream=True):
+        if done:
+            progress.finish(ANALYSIS_STAGES[index], text)
+            responses[index] = text
+        else:
+            progress.update(ANALYSIS_STAGES[index], text)
+    semantic_index.remember(app, inputs, responses)
+
+# Function to show which models answered and put the problem on the opportunity matrix (once per key, e.g. a job ID)
+def show_result(problem, responses, models, key=None):
+    # Routing may have answered some sections with the fallback model
+    st.caption("Answered by " + ", ".join(f"{stage}: {model or 'unknown'}" for stage, model in zip(ANALYSIS_STAGES, models)))
+
+    # Potential and challenge scores (scale of 1-10) come from the score lines of the market and challenges analyses
+    potential_score = parse_score(responses[ANALYSIS_STAGES.index("potential")], "potential")
+    challenge_score = parse_score(responses[ANALYSIS_STAGES.index("challenges")], "challenge")
+    if potential_score is None or challenge_score is None:
+        st.info("The analysis did not include usable scores, so this problem is left off the opportunity matrix.")
+        return
+    plotted = st.session_state.setdefault("plotted_jobs", set())
+    if key is None or key not in plotted:
+        plotted.add(key)
+        st.session_state.setdefault("opportunities", []).append(opportunity(problem, potential_score, challenge_score))
+
+# Function to render an app's page. run_job is the app's job runner; on_result, if given, is called with the
+# inputs once their analysis is shown (a stored one or a finished job)
+def page(app, run_job, title, intro, button, on_result=None):
+    jobs.register(app, run_job)
+    job_key = f"{app}_job"
+
+    st.title(title)
+
+    st.write(intro)
+
+    # Step 1: Define the Core Problem
+    st.header("Step 1: Define the Core Problem")
+    with st.expander("Click here to describe the core problem", expanded=True):
+        problem = st.text_area(
+            "What is the core problem you are facing?",
+            placeholder="Describe the problem in one or two sentences.",
+            help="Please describe the problem in one or two sentences. Provide the context (the industry, the environment, the task, the process in which the problem is located). Example: In many production plants such as steel or automotive production, high noise levels and extreme heat create a harsh work environment for the workers."
+        )
+
+    # Step 2: Immediate Effect
+    st.header("Step 2: Immediate Effect")
+    with st.expander("Click here to describe the immediate effect of the problem", expanded=True):
+        barrier = st.text_area(
+            "What is the immediate effect of the problem?",
+            placeholder="Describe the immediate consequences of the problem.",
+            help="Please describe the consequences of the problem. Try to indicate why it is a relevant problem. Do not go into numbers and details yet. Example: The harsh environment leads to worker fatigue, increased safety incidents, and lower productivity. Prolonged exposure to noise and heat can result in long-term health issues, including hearing loss and heat-related illnesses, and turnover."
+        )
+
+    # Step 3: Context Relevance
+    st.header("Step 3: Context Relevance")
+    with st.expander("Click here to describe the contexts where the problem is more or less relevant", expanded=True):
+        context = st.text_area(
+            "Are there situations or contexts in which this problem is less relevant or particularly relevant?",
+            placeholder="Describe the contexts where the problem is more or less present.",
+            help="The problem may not always be equally relevant and severe. Try to describe when or in which context the problem is more or less present. Example: This problem is more relevant in continuous, high-intensity operations like steel forging and for workers that cannot even leave the production plant during the breaks (long distances)."
+        )
+
+    # Step 4: Affected Parties
+    st.header("Step 4: Affected Parties")
+    with st.expander("Click here to describe who is affected by the problem", expanded=True):
+        affected = st.text_area(
+            "Who is particularly affected?",
+            placeholder="Specify the groups affected by the problem.",
+            help="Try to specify the group of subjects (people, firms, governments, animals and plants, etc.) that are mostly affected by the problem. Example: The group affected are production workers, machine operators, and maintenance staff who are directly exposed to the harsh conditions. Additionally, supervisors, production plant designers, and safety personnel responsible for monitoring and ensuring a safe work environment are also impacted."
+        )
+
+    # Step 5: Challenges
+    st.header("Step 5: Challenges to Solve the Problem")
+    with st.expander("Click here to describe the challenges in solving the problem", expanded=True):
+        wish = st.text_area(
+            "What are the factors making this problem very challenging to remove?",
+            placeholder="Describe the challenges in solving the problem.",
+            help="Try to describe briefly why it is hard to solve the problem. What are the restrictions, interdependencies, etc., that make many potential solutions not effective or feasible? Example: Implementing protective measures, such as improved ventilation or soundproofing, can be costly and may disrupt workflow, while personal protective equipment, though helpful, can be uncomfortable and may hinder workers' mobility and performance. Additionally, regulatory compliance and budget constraints further complicate the implementation of effective solutions."
+        )
+
+    # Button to run the agents (also triggered by "Run a fresh analysis" after a stored analysis was shown)
+    generate = st.button(button)
+    fresh = st.session_state.pop("run_fresh_analysis", False)
+    if generate or fresh:
+        if problem and barrier and affected and wish:
+            try:
+                # A near-identical problem analysed before is answered from the semantic index without any API call
+                inputs = {"problem": problem, "barrier": barrier, "affected": affected, "wish": wish}
+                similar = None if fresh else semantic_index.find_similar(app, inputs)
+                if similar is not None:
+                    jobs.untrack(job_key)
+                    st.info(f"A very similar problem was analysed before (similarity {similar.score:.0%}), so its stored analysis is shown: \"{similar.entry['inputs']['problem']}\"")
+                    st.button("Run a fresh analysis", on_click=request_fresh_analysis)
+                    responses = similar.entry["analyses"]
+                    for section, text in zip(ANALYSIS_SECTIONS, responses):
+                        st.subheader(section)
+                        st.markdown(strip_scores(text))
+                    show_result(problem, responses, similar.entry.get("models") or [None] * len(responses))
+                    if on_result:
+                        on_result(inputs)
+                else:
+                    # The analyses run in a background job that survives reruns and reconnects
+                    jobs.start(job_key, app, inputs)
+            except Exception as e:
+                st.error(f"An error occurred: {e}")
+        else:
+            st.error("Please fill in all fields before generating the analysis.")
+
+    # The analysis job of this session, live while it runs (the score lines are for the matrix, not for the reader)
+    job = jobs.show(jobs.tracked(job_key), list(zip(ANALYSIS_STAGES, ANALYSIS_SECTIONS)), strip_scores)
+    if job is not None and job["status"] == "done":
+        show_result(job["params"]["problem"], [job["outputs"].get(stage) for stage in ANALYSIS_STAGES],
+                    [job["models"].get(stage) for stage in ANALYSIS_STAGES], job["id"])
+        if on_result:
+            on_result(job["params"])
+
+    # Opportunity Matrix: every problem analysed in this session, plus an optional portfolio of batch results
+    with st.expander("Add batch results (JSONL written by batch.py) to the opportunity matrix"):
+        batch_results = st.file_uploader("Batch results", type=["jsonl"], label_visibility="collapsed")
+    opportunities = list(st.session_state.get("opportunities", []))
+    if batch_results is not None:
+        opportunities += load_batch_opportunities(batch_results.getvalue())
+    if opportunities:
+        st.subheader("Opportunity Matrix")
+        plot_opportunity_matrix(opportunities)
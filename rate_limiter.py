@@ -0,0 +1,156 @@
+import collections
+import os
+import threading
+import time
+
+# Client-side rate limiting shared by every session in the process.
+# Each model gets a requests-per-minute and an estimated tokens-per-minute token bucket; callers queue
+# first-come first-served until both buckets can pay for their request, and a Retry-After from the API
+# pauses the whole queue instead of every session backing off on its own.
+
+# Requests and tokens per minute per model; override with LLM_RATE_LIMITS="gpt-4=500:10000,gpt-4-turbo=500:30000"
+DEFAULT_LIMITS = {
+    "gpt-3.5-turbo": (3500, 90000),
+    "gpt-4": (500, 10000),
+    "gpt-4-turbo": (500, 30000),
+}
+FALLBACK_LIMITS = (500, 10000)  # For models missing from the table
+
+# Completion tokens assumed for requests that do not set max_tokens
+DEFAULT_COMPLETION_TOKENS = 1000
+CANCEL_POLL = 0.25  # Seconds between cancellation checks while queued
+
+
+# Function to parse the LLM_RATE_LIMITS override
+def _configured_limits():
+    limits = dict(DEFAULT_LIMITS)
+    for item in filter(None, os.environ.get("LLM_RATE_LIMITS", "").split(",")):
+        model, _, values = item.partition("=")
+        rpm, _, tpm = values.partition(":")
+        limits[model.strip()] = (int(rpm), int(tpm))
+    return limits
+
+
+# Function to approximate the token count of a text (~4 characters per token for English)
+def approximate_tokens(text):
+    return len(text or "") // 4
+
+
+# Function to estimate the tokens a request will consume (prompt plus the completion budget)
+def estimate_tokens(request):
+    prompt_tokens = sum(approximate_tokens(message.get("content")) for message in request.get("messages", []))
+    return prompt_tokens + (request.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.available = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Seconds until amount can be taken (amounts above the capacity only wait for a full bucket)
+    def wait_time(self, amount, now):
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.available
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount):
+        self.available -= min(amount, self.capacity)
+
+    # Give back (or charge) the difference between estimated and actual usage
+    def adjust(self, amount):
+        self.available = min(self.capacity, self.available + amount)
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.paused_until = 0.0
+        self._condition = threading.Condition()
+        self._queue = collections.deque()
+
+    # Block until this request is at the head of the queue and both buckets can pay for it; returns seconds waited.
+    # Raises TimeoutError once the (monotonic) deadline passes or the cancel event is set while still queued.
+    def acquire(self, tokens, deadline=None, cancel=None):
+        started = time.monotonic()
+        ticket = object()
+        with self._condition:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    timeout = None
+                    if self._queue[0] is ticket:
+                        timeout = max(
+                            self.paused_until - now,
+                            self.requests.wait_time(1, now),
+                            self.tokens.wait_time(tokens, now),
+                        )
+                        if timeout <= 0:
+                            self.requests.take(1)
+                            self.tokens.take(tokens)
+                            return time.monotonic() - started
+                    if (deadline is not None and now >= deadline) or (cancel is not None and cancel.is_set()):
+                        raise TimeoutError("Gave up waiting for the rate limiter")
+                    if deadline is not None:
+                        timeout = deadline - now if timeout is None else min(timeout, deadline - now)
+                    if cancel is not None:
+                        timeout = CANCEL_POLL if timeout is None else min(timeout, CANCEL_POLL)
+                    self._condition.wait(timeout)
+            finally:
+                self._queue.remove(ticket)
+                self._condition.notify_all()
+
+    # Take capacity only if it is available right now (used for optional duplicate requests that must never queue)
+    def try_acquire(self, tokens):
+        with self._condition:
+            now = time.monotonic()
+            if self._queue or now < self.paused_until or self.requests.wait_time(1, now) > 0 or self.tokens.wait_time(tokens, now) > 0:
+                return False
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            return True
+
+    # Correct the token bucket once the actual usage of a request is known
+    def settle(self, estimated_tokens, actual_tokens):
+        with self._condition:
+            self.tokens.adjust(estimated_tokens - actual_tokens)
+            self._condition.notify_all()
+
+    # Hold back every queued request, e.g. for the Retry-After period of a 429 response
+    def pause(self, seconds):
+        with self._condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self._condition.notify_all()
+
+    # Whether the queue is currently held back by the API (a 429 with Retry-After was seen)
+    def paused(self):
+        return time.monotonic() < self.paused_until
+
+
+_limiters_lock = threading.Lock()
+_limiters = {}
+
+
+# Function to get the process-wide limiter for a model
+def get_limiter(model):
+    with _limiters_lock:
+        if model not in _limiters:
+            limits = _configured_limits()
+            _limiters[model] = RateLimiter(*limits.get(model, FALLBACK_LIMITS))
+        return _limiters[model]
+
+
+# Function to read the Retry-After header (in seconds) from an OpenAI error, if the API sent one
+def retry_after(error):
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
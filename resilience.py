@@ -0,0 +1,180 @@
+import collections
+import os
+import random
+import threading
+import time
+
+# Handling of transient API failures, shared by every app. Errors are classified (rate limited, transient, fatal);
+# transient ones are retried after a full-jitter backoff, as long as the model's retry budget allows, so a degraded
+# provider is not hit with a retry storm from every session at once. A per-model circuit breaker opens when too many
+# recent calls failed: calls then fail fast (or are handed to the cache or a fallback model by llm_client) instead
+# of hanging until their timeouts, and after a cooldown a single probe call decides whether it closes again.
+
+MAX_ATTEMPTS = int(os.environ.get("OPENAI_MAX_RETRIES", "3"))  # Attempts per call, the first one included
+RETRY_DELAY = float(os.environ.get("OPENAI_RETRY_DELAY", "2"))  # Backoff cap of the first retry, doubled per retry
+RETRY_MAX_DELAY = float(os.environ.get("OPENAI_RETRY_MAX_DELAY", "30"))
+# Retries per model within RETRY_BUDGET_WINDOW: at most RETRY_BUDGET_MIN plus RETRY_BUDGET_RATIO of the calls
+RETRY_BUDGET_RATIO = float(os.environ.get("RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MIN = int(os.environ.get("RETRY_BUDGET_MIN", "5"))
+RETRY_BUDGET_WINDOW = 60.0  # Seconds
+# The circuit of a model opens when at least BREAKER_MIN_CALLS calls in BREAKER_WINDOW seconds ended and
+# BREAKER_FAILURE_RATE of them failed transiently; it stays open for BREAKER_COOLDOWN seconds
+BREAKER_FAILURE_RATE = float(os.environ.get("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_MIN_CALLS = int(os.environ.get("BREAKER_MIN_CALLS", "6"))
+BREAKER_WINDOW = float(os.environ.get("BREAKER_WINDOW", "60"))
+BREAKER_COOLDOWN = float(os.environ.get("BREAKER_COOLDOWN", "30"))
+
+# Error classes (by exception class name, so openai need not be imported here)
+RATE_LIMITED = "rate_limited"
+TRANSIENT = "transient"
+FATAL = "fatal"
+_RATE_LIMIT_ERRORS = {"RateLimitError"}
+_TRANSIENT_ERRORS = {
+    "Timeout", "APIError", "APIConnectionError", "ServiceUnavailableError", "TryAgain",  # openai.error
+    "ConnectionError", "ReadTimeout", "ConnectTimeout", "ChunkedEncodingError",  # requests
+    "TimeoutError",
+}
+
+
+# Raised instead of calling a model whose circuit is open
+class CircuitOpen(Exception):
+    def __init__(self, model, retry_in):
+        super().__init__(f"{model} is failing right now; calls to it are paused for another {retry_in:.0f}s.")
+        self.model = model
+        self.retry_in = retry_in
+
+
+# Function to classify an API error: RATE_LIMITED, TRANSIENT (worth another attempt) or FATAL
+def classify(error):
+    names = {cls.__name__ for cls in type(error).__mro__}
+    if names & _RATE_LIMIT_ERRORS:
+        return RATE_LIMITED
+    if names & _TRANSIENT_ERRORS:
+        # openai raises APIError for any unexpected status; only server-side ones are transient
+        status = getattr(error, "http_status", None)
+        return TRANSIENT if status is None or status >= 500 or status in (408, 409) else FATAL
+    return FATAL
+
+
+# Function to compute the full-jitter backoff before retry number attempt (0 for the first retry)
+def backoff(attempt):
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_DELAY * 2 ** attempt))
+
+
+class RetryBudget:
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, minimum=RETRY_BUDGET_MIN, window=RETRY_BUDGET_WINDOW):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.window = window
+        self._calls = collections.deque()  # Monotonic times of calls
+        self._retries = collections.deque()  # Monotonic times of retries
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        for times in (self._calls, self._retries):
+            while times and now - times[0] > self.window:
+                times.popleft()
+
+    def record_call(self):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._calls.append(now)
+
+    # Reserve a retry if the budget has one left
+    def try_retry(self):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if len(self._retries) >= self.minimum + self.ratio * len(self._calls):
+                return False
+            self._retries.append(now)
+            return True
+
+
+class CircuitBreaker:
+    def __init__(self, model, failure_rate=BREAKER_FAILURE_RATE, min_calls=BREAKER_MIN_CALLS, window=BREAKER_WINDOW, cooldown=BREAKER_COOLDOWN):
+        self.model = model
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self._outcomes = collections.deque()  # (monotonic time, failed)
+        self._opened = None  # Monotonic time the circuit opened, None while closed
+        self._probe = None  # Monotonic time the half-open probe was let through
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    # "closed", "open" or "half-open" (cooled down, waiting for a probe call to decide)
+    def state(self):
+        with self._lock:
+            if self._opened is None:
+                return "closed"
+            return "open" if time.monotonic() - self._opened < self.cooldown else "half-open"
+
+    # Let a call through, or raise CircuitOpen; while half-open only one probe at a time goes through
+    def before_call(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._opened is None:
+                return
+            if now - self._opened >= self.cooldown and (self._probe is None or now - self._probe >= self.cooldown):
+                self._probe = now  # A probe that never reports back is replaced after another cooldown
+                return
+            raise CircuitOpen(self.model, max(1.0, self._opened + self.cooldown - now))
+
+    # Return the CircuitOpen error while the circuit is open (not yet half-open), else None
+    def open_error(self):
+        with self._lock:
+            retry_in = None if self._opened is None else self._opened + self.cooldown - time.monotonic()
+        return CircuitOpen(self.model, max(1.0, retry_in)) if retry_in is not None and retry_in > 0 else None
+
+    # Calls that were already running when the circuit opened do not count; once half-open, the probe decides
+    def record_success(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._opened is not None:
+                if now - self._opened >= self.cooldown:
+                    # The probe went through: close and start counting afresh
+                    self._opened = self._probe = None
+                    self._outcomes.clear()
+                return
+            self._outcomes.append((now, False))
+            self._expire(now)
+
+    def record_failure(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._opened is not None:
+                if now - self._opened >= self.cooldown:
+                    self._opened, self._probe = now, None  # The probe failed: stay open for another cooldown
+                return
+            self._outcomes.append((now, True))
+            self._expire(now)
+            failures = sum(1 for _, failed in self._outcomes if failed)
+            if len(self._outcomes) >= self.min_calls and failures >= self.failure_rate * len(self._outcomes):
+                self._opened = now
+
+
+_lock = threading.Lock()
+_breakers = {}
+_budgets = {}
+
+
+# Function to get the circuit breaker of a model (one per process)
+def get_breaker(model):
+    with _lock:
+        if model not in _breakers:
+            _breakers[model] = CircuitBreaker(model)
+        return _breakers[model]
+
+
+# Function to get the retry budget of a model (one per process)
+def get_budget(model):
+    with _lock:
+        if model not in _budgets:
+            _budgets[model] = RetryBudget()
+        return _budgets[model]
@@ -0,0 +1,87 @@
+import os
+
+import metrics
+import rate_limiter
+import resilience
+
+# Model routing per (app, stage). Every route has a primary model and optionally a faster fallback; a call goes to
+# the fallback while the primary is degraded, i.e. its circuit is open (resilience.py), its rolling p95 time to the
+# first streamed token is above the route's budget, too many of its recent calls failed, or the API is rate-limiting
+# it. The time to the first token is judged rather than the whole upstream latency, which mostly measures how long
+# the answer is. Degraded samples age out of the metrics window (METRICS_WINDOW), after which calls return to the
+# primary on their own. The same (app, stage) keys also give every call its deadline.
+
+# (app, stage) -> (primary, fallback or None, p95 time-to-first-token budget in seconds or None for the default);
+# stage "*" matches any stage
+ROUTES = {
+    ("transformer", "*"): ("gpt-3.5-turbo", None, None),
+    ("proban", "*"): ("gpt-4-turbo", "gpt-3.5-turbo", None),
+    ("lean", "*"): ("gpt-4", "gpt-4-turbo", 15.0),
+    ("compt", "competitors"): ("gpt-4-turbo", "gpt-3.5-turbo", None),
+    ("compt", "*"): ("gpt-3.5-turbo", None, None),
+    ("ideas", "*"): ("gpt-4-turbo", "gpt-3.5-turbo", None),
+}
+# (app, stage) -> deadline in seconds for a whole call, including queueing, retries and streaming
+DEADLINES = {
+    ("transformer", "*"): 90.0,
+    ("proban", "*"): 90.0,
+    ("lean", "*"): 120.0,
+    ("compt", "*"): 120.0,
+    ("ideas", "*"): 150.0,
+}
+DEFAULT_DEADLINE = float(os.environ.get("LLM_DEADLINE", "120"))  # For calls without an entry in DEADLINES
+LATENCY_BUDGET = float(os.environ.get("ROUTING_LATENCY_BUDGET", "10"))  # Default p95 time-to-first-token budget in seconds
+MAX_ERROR_RATE = float(os.environ.get("ROUTING_MAX_ERROR_RATE", "0.2"))
+MIN_SAMPLES = int(os.environ.get("ROUTING_MIN_SAMPLES", "5"))  # Fewer observations never degrade a model
+
+
+# Function to parse the LLM_ROUTES override, e.g. "lean=gpt-4>gpt-3.5-turbo@20,compt.features=gpt-4-turbo"
+def _configured_routes():
+    table = dict(ROUTES)
+    for item in filter(None, os.environ.get("LLM_ROUTES", "").split(",")):
+        target, _, route = item.partition("=")
+        app, _, stage = target.strip().partition(".")
+        models, _, budget = route.partition("@")
+        primary, _, fallback = models.partition(">")
+        table[(app, stage or "*")] = (primary.strip(), fallback.strip() or None, float(budget) if budget else None)
+    return table
+
+
+# Routes in effect, ROUTES plus the LLM_ROUTES override
+routes = _configured_routes()
+
+
+# Function to get the route of a stage, or None when the app has none
+def get_route(app, stage):
+    return routes.get((app, stage)) or routes.get((app, "*"))
+
+
+# Function to tell why a model is degraded for a latency budget, or None when it is healthy
+def degradation(model, budget=None):
+    if resilience.get_breaker(model).state() == "open":
+        return "circuit open"
+    if rate_limiter.get_limiter(model).paused():
+        return "rate limited"
+    error_rate = metrics.registry.error_rate(model, min_samples=MIN_SAMPLES)
+    if error_rate is not None and error_rate > MAX_ERROR_RATE:
+        return f"{error_rate:.0%} errors"
+    p95 = metrics.registry.quantile("first_token", 95, model=model, min_samples=MIN_SAMPLES)
+    if p95 is not None and p95 > (budget or LATENCY_BUDGET):
+        return f"p95 first token {p95:.1f}s"
+    return None
+
+
+# Function to choose the model for a call: the primary unless it is degraded and the fallback is not
+def choose_model(app, stage, default):
+    route = get_route(app, stage)
+    if route is None:
+        return default
+    primary, fallback, budget = route
+    if fallback is None or degradation(primary, budget) is None or degradation(fallback, budget) is not None:
+        return primary
+    return fallback
+
+
+# Function to get the deadline (seconds) of a stage
+def get_deadline(app, stage):
+    return DEADLINES.get((app, stage)) or DEADLINES.get((app, "*")) or DEFAULT_DEADLINE
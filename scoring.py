@@ -0,0 +1,37 @@
+import re
+
+# Machine-readable scores embedded in the market-potential and challenges answers.
+# The prompts ask for a final "POTENTIAL_SCORE: n" / "CHALLENGE_SCORE: n" line, which is parsed locally, so the
+# opportunity matrix gets real coordinates without an extra API call. The parser tolerates markdown decoration,
+# "n/10", decimal commas and lowercase, and returns None when no usable score is found.
+
+SCORE_INSTRUCTIONS = {
+    "potential": "End your answer with a final line of the exact form 'POTENTIAL_SCORE: <number>' that rates the overall market potential from 1 (very low) to 10 (very high).",
+    "challenge": "End your answer with a final line of the exact form 'CHALLENGE_SCORE: <number>' that rates how hard the problem is to solve from 1 (easy) to 10 (extremely hard).",
+}
+
+_SCORE_LINE = re.compile(
+    r"^[ \t>*_`#-]*(?P<name>potential|challenges?)[ _-]*score[ \t*_`]*[:=][ \t*_`]*(?P<value>\d+(?:[.,]\d+)?)(?:[ \t]*/[ \t]*10)?[ \t*_`.]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+# Function to get the score instruction appended to a prompt ("potential" or "challenge")
+def score_instruction(name):
+    return SCORE_INSTRUCTIONS[name]
+
+
+# Function to read a score from an answer; returns a float between 1 and 10, or None if it is missing or malformed
+def parse_score(text, name):
+    score = None
+    for match in _SCORE_LINE.finditer(text or ""):
+        if match.group("name").lower().startswith(name):
+            score = match.group("value")  # The last one wins if the model repeated the line
+    if score is None:
+        return None
+    return min(10.0, max(1.0, float(score.replace(",", "."))))
+
+
+# Function to remove the score lines from an answer before it is shown
+def strip_scores(text):
+    return _SCORE_LINE.sub("", text or "").rstrip()
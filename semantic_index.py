@@ -0,0 +1,187 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+# Near-duplicate lookup for problem descriptions that were analysed before. Each input is embedded with spaCy's
+# static word vectors (tokenizer only, no pipeline) as the mean of its content words, normalised and kept in a
+# float32 matrix, so a lookup is one matrix-vector product. Stopwords, punctuation, numbers and words without a
+# vector are left out of the mean: they make up half of a long text and pull every average towards the same point.
+# The word vectors come from en_core_web_md (installed through requirements.txt). Per app the store is an
+# append-only pair of files: <app>.f32 (raw vectors, memory-mapped once it grows large) and <app>.jsonl (one line
+# per row with the inputs and the stored analysis).
+# The index is off by default: SEMANTIC_THRESHOLD has not been checked against the labelled pairs in
+# tests/test_semantic_index.py yet. Run them with the model installed before setting SEMANTIC_CACHE_ENABLED=1.
+
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "0") != "0"
+SEMANTIC_INDEX_PATH = os.environ.get("SEMANTIC_INDEX_PATH", os.path.join(".cache", "semantic"))
+SEMANTIC_THRESHOLD = float(os.environ.get("SEMANTIC_THRESHOLD", "0.95"))  # Cosine similarity needed to offer a stored analysis
+EMBEDDING = "content-word-mean"  # Stored with the vectors; a store built with another embedding is started afresh
+SEMANTIC_MMAP_ROWS = int(os.environ.get("SEMANTIC_MMAP_ROWS", "50000"))  # Memory-map the vectors beyond this many rows
+# A model with word vectors (the small models have none); without it the index is switched off
+SPACY_MODEL = os.environ.get("SPACY_MODEL", "en_core_web_md")
+
+
+class Match:
+    def __init__(self, score, entry):
+        self.score = score
+        self.entry = entry  # {"inputs": {...}, "analyses": [...], "models": [...]}
+
+
+class SemanticIndex:
+    def __init__(self, path, name, embed, dim, threshold=SEMANTIC_THRESHOLD, mmap_rows=SEMANTIC_MMAP_ROWS):
+        self.embed = embed
+        self.dim = dim
+        self.threshold = threshold
+        self.mmap_rows = mmap_rows
+        self.vectors_path = os.path.join(path, name + ".f32")
+        self.entries_path = os.path.join(path, name + ".jsonl")
+        self._lock = threading.Lock()
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._offsets = []  # Byte offset of each row's line in the entries file
+        self._loaded_size = -1
+        os.makedirs(path, exist_ok=True)
+        self._check_dimension(os.path.join(path, name + ".json"))
+
+    # Start a fresh store when the vectors on disk come from a model with another dimension
+    def _check_dimension(self, meta_path):
+        meta = {"dim": self.dim, "embedding": EMBEDDING}
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                if json.load(f) == meta:
+                    return
+        for path in (self.vectors_path, self.entries_path):
+            if os.path.exists(path):
+                os.remove(path)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    # Reload the store when it changed on disk (another process may have appended); drop half-written rows
+    def _refresh(self):
+        if not os.path.exists(self.vectors_path) or not os.path.exists(self.entries_path):
+            open(self.vectors_path, "ab").close()
+            open(self.entries_path, "ab").close()
+        size = os.path.getsize(self.vectors_path)
+        if size == self._loaded_size:
+            return
+        offsets, position = [], 0
+        with open(self.entries_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offsets.append(position)
+                position += len(line)
+        row_bytes = self.dim * 4
+        rows = min(size // row_bytes, len(offsets))
+        if size != rows * row_bytes:
+            os.truncate(self.vectors_path, rows * row_bytes)
+        if len(offsets) > rows or position != os.path.getsize(self.entries_path):
+            os.truncate(self.entries_path, offsets[rows] if rows < len(offsets) else position)
+        if rows == 0:
+            self._vectors = np.empty((0, self.dim), dtype=np.float32)
+        elif rows > self.mmap_rows:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        else:
+            self._vectors = np.fromfile(self.vectors_path, dtype=np.float32, count=rows * self.dim).reshape(rows, self.dim)
+        self._offsets = offsets[:rows]
+        self._loaded_size = rows * row_bytes
+
+    def _vector(self, text):
+        vector = np.asarray(self.embed(text), dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else None  # No known words, nothing to compare
+
+    # Return the most similar stored entry as a Match, or None when nothing reaches the threshold
+    def find(self, text):
+        vector = self._vector(text)
+        if vector is None:
+            return None
+        with self._lock:
+            self._refresh()
+            if not self._offsets:
+                return None
+            scores = self._vectors @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            with open(self.entries_path, "rb") as f:
+                f.seek(self._offsets[best])
+                entry = json.loads(f.readline())
+        return Match(float(scores[best]), entry)
+
+    # Append an analysed input and its analysis to the store
+    def add(self, text, entry):
+        vector = self._vector(text)
+        if vector is None:
+            return
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            self._refresh()
+            with open(self.entries_path, "ab") as f:
+                f.write(line)
+            with open(self.vectors_path, "ab") as f:
+                f.write(vector.tobytes())
+            self._loaded_size = -1  # Pick the new row up on the next lookup
+
+
+# Function to turn the analysed fields into the text that is embedded
+def problem_text(inputs):
+    return "\n".join(str(inputs[field]).strip() for field in ("problem", "barrier", "affected", "wish"))
+
+
+# Function to embed a text as the mean vector of its content words (a zero vector when it has none)
+def embed(nlp, text):
+    vectors = [
+        token.vector for token in nlp.make_doc(text)
+        if token.has_vector and not (token.is_stop or token.is_punct or token.is_space or token.like_num)
+    ]
+    return np.mean(vectors, axis=0) if vectors else np.zeros(nlp.vocab.vectors_length, dtype=np.float32)
+
+
+_nlp_lock = threading.Lock()
+_nlp = None
+_indexes = {}
+
+
+# Function to load the spaCy vectors once per process; returns None when no model with vectors is installed
+def _load_nlp():
+    global _nlp
+    with _nlp_lock:
+        if _nlp is None:
+            import spacy
+
+            try:
+                nlp = spacy.load(SPACY_MODEL, exclude=["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "ner", "senter"])
+            except OSError:
+                nlp = False
+            _nlp = nlp if nlp and nlp.vocab.vectors_length else False
+    return _nlp or None
+
+
+# Function to get the index of an app (for example "transformer"), or None when the semantic cache is unavailable
+def get_index(app):
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    nlp = _load_nlp()
+    if nlp is None:
+        return None
+    with _nlp_lock:
+        if app not in _indexes:
+            _indexes[app] = SemanticIndex(SEMANTIC_INDEX_PATH, app, lambda text: embed(nlp, text), nlp.vocab.vectors_length)
+        return _indexes[app]
+
+
+# Function to look up a previously analysed problem similar to these inputs
+def find_similar(app, inputs):
+    index = get_index(app)
+    return index.find(problem_text(inputs)) if index is not None else None
+
+
+# Function to store the analysis of these inputs for later lookups
+def remember(app, inputs, analyses):
+    index = get_index(app)
+    if index is not None:
+        models = [getattr(text, "model", None) for text in analyses]
+        index.add(problem_text(inputs), {"inputs": inputs, "analyses": list(analyses), "models": models})
+
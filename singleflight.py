@@ -0,0 +1,124 @@
+import threading
+import time
+
+# In-flight request coalescing: while a call for a key is running, identical calls from other sessions
+# attach to it and share its result instead of calling upstream again. The call runs in a thread of its own, and
+# every attached caller (the one that started it included) replays its streamed tokens as they arrive, so every
+# page keeps streaming. A caller that gives up (it was cancelled, ran out of time or its script run was stopped)
+# only detaches itself: the call keeps running for the callers still attached, and is cancelled once none are left.
+
+POLL_INTERVAL = 0.25  # Seconds between deadline and cancellation checks of an attached caller
+
+
+class _Flight:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.tokens = []
+        self.finished = False
+        self.result = None
+        self.error = None
+        self.deadlines = []  # Deadline (monotonic, or None for none) of every attached caller
+        self.cancel = threading.Event()  # Set once every caller detached: nobody wants the result any more
+
+    # The call may run until the last attached caller's deadline; None while some caller has no deadline
+    def deadline(self):
+        with self.condition:
+            if not self.deadlines or None in self.deadlines:
+                return None
+            return max(self.deadlines)
+
+    def publish(self, token):
+        with self.condition:
+            self.tokens.append(token)
+            self.condition.notify_all()
+
+    def finish(self, result=None, error=None):
+        with self.condition:
+            self.result = result
+            self.error = error
+            self.finished = True
+            self.condition.notify_all()
+
+    # Replay the call's tokens to on_token as they arrive and return its result.
+    # Raises TimeoutError when the (monotonic) deadline passes or the cancel event is set before the call finished.
+    def wait(self, on_token, deadline=None, cancel=None):
+        replayed = 0
+        with self.condition:
+            while True:
+                pending = self.tokens[replayed:]
+                replayed += len(pending)
+                if on_token and pending:
+                    # Never call back into the page while holding the lock
+                    self.condition.release()
+                    try:
+                        for token in pending:
+                            on_token(token)
+                    finally:
+                        self.condition.acquire()
+                    continue
+                if self.finished:
+                    break
+                if (deadline is not None and time.monotonic() >= deadline) or (cancel is not None and cancel.is_set()):
+                    raise TimeoutError("Gave up waiting for the call in flight")
+                self.condition.wait(POLL_INTERVAL if deadline is not None or cancel is not None else None)
+        if self.error is not None:
+            raise self.error
+        if on_token and not replayed:
+            # The call did not stream; hand over the whole text at once
+            on_token(self.result)
+        return self.result
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    # Run fn(publish, flight) once per key at a time and return its result.
+    # fn receives a publish(token) callback that streams tokens to every attached caller (None unless the caller
+    # that starts the call streams), and the flight, whose cancel event and deadline() bound the call.
+    # deadline (monotonic) and cancel bound how long this caller waits, see _Flight.wait.
+    def do(self, key, fn, on_token=None, deadline=None, cancel=None):
+        with self._lock:
+            flight = self._flights.get(key)
+            start = flight is None
+            if start:
+                flight = self._flights[key] = _Flight()
+            with flight.condition:
+                flight.deadlines.append(deadline)
+        if start:
+            threading.Thread(
+                target=self._run, args=(key, flight, fn, on_token is not None), name="singleflight", daemon=True
+            ).start()
+        try:
+            return flight.wait(on_token, deadline, cancel)
+        except BaseException:
+            self._detach(key, flight, deadline)
+            raise
+
+    def _run(self, key, flight, fn, stream):
+        try:
+            result = fn(flight.publish if stream else None, flight)
+        except BaseException as e:
+            self._forget(key, flight)
+            flight.finish(error=e)
+        else:
+            # Unregistered before it finishes, so a later caller starts a new call rather than joining a finished one
+            self._forget(key, flight)
+            flight.finish(result=result)
+
+    # A caller gave up: the last one to leave cancels the call, and a later caller starts a new one
+    def _detach(self, key, flight, deadline):
+        with self._lock:
+            with flight.condition:
+                flight.deadlines.remove(deadline)
+                abandoned = not flight.deadlines and not flight.finished
+            if abandoned:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.cancel.set()
+
+    def _forget(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
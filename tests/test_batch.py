@@ -0,0 +1,64 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import batch
+
+
+class BatchRunTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.input = os.path.join(self.directory, "problems.csv")
+        self.output = os.path.join(self.directory, "results.jsonl")
+        with open(self.input, "w", encoding="utf-8") as f:
+            f.write("id,problem,barrier,affected,wish\n")
+            for number in range(1, 6):
+                f.write(f"r{number},Problem {number},Barrier,Workers,Wish\n")
+        self.analysed = []
+
+    # Stand-in for analyse_row: no API calls; row r4 fails
+    def analyse(self, analysis_tasks, app, row_id, row):
+        self.analysed.append(row_id)
+        if row_id == "r4":
+            raise RuntimeError("API down")
+        return {"id": row_id, "app": app, **row}
+
+    def run_batch(self):
+        with mock.patch.object(batch, "analyse_row", side_effect=self.analyse):
+            return batch.run(self.input, self.output, "proban", 2)
+
+    def output_ids(self):
+        with open(self.output, encoding="utf-8") as f:
+            return [json.loads(line)["id"] for line in f]
+
+    def test_failed_rows_are_retried_on_the_next_run(self):
+        self.assertEqual(self.run_batch(), (4, 1))
+        self.assertEqual(sorted(self.output_ids()), ["r1", "r2", "r3", "r5"])
+        self.analysed.clear()
+        self.assertEqual(self.run_batch(), (0, 1))
+        self.assertEqual(self.analysed, ["r4"])
+
+    def test_resume_after_a_line_cut_off_by_an_interrupted_run(self):
+        with open(self.output, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"id": "r1"}) + "\n" + '{"id": "r2", "problem": "Probl')
+        self.assertEqual(batch.completed_ids(self.output), {"r1"})
+        self.assertEqual(self.run_batch(), (3, 1))
+        self.assertEqual(sorted(self.analysed), ["r2", "r3", "r4", "r5"])
+        with open(self.output, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[1], '{"id": "r2", "problem": "Probl')
+        self.assertEqual(sorted(json.loads(line)["id"] for line in lines[2:]), ["r2", "r3", "r5"])
+
+    def test_missing_columns(self):
+        with open(self.input, "w", encoding="utf-8") as f:
+            f.write("problem,barrier\nA,B\n")
+        with self.assertRaises(ValueError):
+            list(batch.read_rows(self.input))
+
+
+if __name__ == "__main__":
+    unittest.main()
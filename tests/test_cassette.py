@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import cassette
+
+
+def chunk(content):
+    import openai
+
+    return openai.openai_object.OpenAIObject.construct_from({"id": "c1", "model": "gpt-4", "choices": [{"index": 0, "delta": {"content": content}}]})
+
+
+class CassetteTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.path = os.path.join(self.directory, "cassette.jsonl")
+        self.sent = []
+
+    def request(self, content, stream=False):
+        request = {"model": "gpt-4", "messages": [{"role": "user", "content": content}], "request_timeout": 30}
+        return dict(request, stream=True) if stream else request
+
+    # Fake openai.ChatCompletion.create
+    def send(self, **request):
+        import openai
+
+        self.sent.append(request)
+        content = request["messages"][-1]["content"]
+        if request.get("stream"):
+            return (chunk(word) for word in (f"{content} ", "reply"))
+        return openai.openai_object.OpenAIObject.construct_from({
+            "id": "r1", "model": "gpt-4", "usage": {"prompt_tokens": 3, "completion_tokens": 2},
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": f"{content} answer"}}],
+        })
+
+    def record(self):
+        recorder = cassette.Cassette(self.path)
+        self.assertEqual(recorder.record(self.send, self.request("full"))["choices"][0]["message"]["content"], "full answer")
+        chunks = recorder.record(self.send, self.request("streamed", stream=True))
+        self.assertEqual([c.choices[0].delta["content"] for c in chunks], ["streamed ", "reply"])
+        return cassette.Cassette(self.path)
+
+    def test_replay_answers_in_the_recorded_form(self):
+        player = self.record()
+        response = player.replay(self.request("full"))
+        self.assertEqual((response.choices[0].message["content"], response["usage"]["prompt_tokens"]), ("full answer", 3))
+        chunks = player.replay(self.request("streamed", stream=True))
+        self.assertEqual([c.choices[0].delta["content"] for c in chunks], ["streamed ", "reply"])
+        self.assertEqual(len(self.sent), 2)
+
+    def test_replay_converts_between_stream_and_full_response(self):
+        player = self.record()
+        chunks = list(player.replay(self.request("full", stream=True)))
+        self.assertEqual([c.choices[0].delta["content"] for c in chunks], ["full answer"])
+        response = player.replay(self.request("streamed"))
+        self.assertEqual(response.choices[0].message["content"], "streamed reply")
+
+    def test_transport_options_do_not_change_the_key(self):
+        player = self.record()
+        response = player.replay(dict(self.request("full"), request_timeout=5))
+        self.assertEqual(response.choices[0].message["content"], "full answer")
+
+    def test_missing_request(self):
+        player = self.record()
+        with self.assertRaises(cassette.CassetteMiss):
+            player.replay(self.request("never recorded"))
+
+    def test_repeated_recordings_are_replayed_in_turn(self):
+        recorder = cassette.Cassette(self.path)
+        for content in ("first", "second"):
+            recorder.record(lambda **request: self.send(**dict(request, messages=[{"role": "user", "content": content}])), self.request("same"))
+        player = cassette.Cassette(self.path)
+        replies = [player.replay(self.request("same")).choices[0].message["content"] for _ in range(3)]
+        self.assertEqual(replies, ["first answer", "second answer", "first answer"])
+
+    def test_an_unfinished_stream_is_not_recorded(self):
+        recorder = cassette.Cassette(self.path)
+        chunks = recorder.record(self.send, self.request("cut", stream=True))
+        next(chunks)
+        chunks.close()
+        with self.assertRaises(cassette.CassetteMiss):
+            cassette.Cassette(self.path).replay(self.request("cut", stream=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+
+from compaction import compact, extract_items
+from rate_limiter import approximate_tokens
+
+ANSWER = """## Value Hypothesis
+1. **Workers** will wear the helmet for a full shift. It is light and cool.
+2. Plant managers pay for the helmets. Budgets are tight.
+
+## Growth Hypothesis
+- Word of mouth spreads between plants. Trade fairs help too.
+
+Some closing remarks that are not a list item.
+"""
+
+
+class CompactTest(unittest.TestCase):
+    def test_keeps_headings_and_first_sentences_of_items(self):
+        self.assertEqual(
+            compact(ANSWER, 200),
+            "Value Hypothesis:\n- Workers will wear the helmet for a full shift.\n- Plant managers pay for the helmets.\n"
+            "Growth Hypothesis:\n- Word of mouth spreads between plants.",
+        )
+
+    def test_stays_within_the_budget_without_a_dangling_heading(self):
+        for budget in range(0, 60, 5):
+            text = compact(ANSWER, budget)
+            self.assertLessEqual(sum(approximate_tokens(line) + 1 for line in text.splitlines()), budget)
+            self.assertFalse(text.endswith(":"), text)
+
+    def test_answers_without_items_keep_the_first_sentence_of_each_paragraph(self):
+        text = "First point. With detail.\n\nSecond point! More detail."
+        self.assertEqual(extract_items(text), [("item", "First point."), ("item", "Second point!")])
+        self.assertEqual(compact(text, 100), "- First point.\n- Second point!")
+
+    def test_is_deterministic(self):
+        self.assertEqual(compact(ANSWER, 30), compact(ANSWER, 30))
+        self.assertEqual(compact("", 30), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
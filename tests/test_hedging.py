@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+
+class StreamedHedgeTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault("OPENAI_API_KEY", "test")
+        import llm_client
+        import metrics
+
+        cls.llm_client = llm_client
+        cls.metrics = metrics
+
+    def setUp(self):
+        import openai
+
+        self.requests = []
+        self.closed = threading.Event()
+        self.patches = [
+            mock.patch.object(openai.ChatCompletion, "create", side_effect=self.create),
+            mock.patch.object(self.llm_client, "_hedges", self.llm_client._HedgeBudget(1.0)),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    # Fake streamed API: the first request stalls before its first token, later ones answer straight away
+    def create(self, **request):
+        import openai
+
+        number = len(self.requests)
+        self.requests.append(request)
+
+        def chunks():
+            try:
+                if number == 0:
+                    time.sleep(1.0)
+                for word in (f"reply{number} ", "done"):
+                    yield openai.openai_object.OpenAIObject.construct_from({"choices": [{"delta": {"content": word}}]})
+            finally:
+                if number == 0:
+                    self.closed.set()
+
+        return chunks()
+
+    def complete(self, first_token_p90):
+        tokens = []
+        with mock.patch.object(self.metrics.registry, "quantile", return_value=first_token_p90):
+            started = time.monotonic()
+            text = self.llm_client.complete([{"role": "user", "content": "hedge test"}], on_token=tokens.append,
+                                            cache=False, model="gpt-3.5-turbo", hedge=True, deadline=10)
+        return text, tokens, time.monotonic() - started
+
+    def test_a_stalled_stream_is_hedged_and_closed(self):
+        text, tokens, elapsed = self.complete(0.1)
+        self.assertEqual((text, tokens), ("reply1 done", ["reply1 ", "done"]))
+        self.assertLess(elapsed, 0.8)
+        self.assertEqual(len(self.requests), 2)
+        self.assertTrue(self.closed.wait(3), "the losing stream was not closed")
+
+    def test_no_hedge_without_a_first_token_history(self):
+        text, tokens, elapsed = self.complete(None)
+        self.assertEqual((text, len(self.requests)), ("reply0 done", 1))
+        self.assertGreaterEqual(elapsed, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
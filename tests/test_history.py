@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import history
+
+
+class HistoryStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.store = history.HistoryStore(os.path.join(self.directory, "history.sqlite"))
+
+    def add(self, number, app="transformer", text=None):
+        return self.store.add(app, {"problem": f"Problem {number}"}, {"summary": text or f"Summary {number}"})
+
+    def test_the_same_analysis_is_kept_once(self):
+        first = self.store.add("lean", {"problem_description": "Noise"}, {"mvp": "Booth", "testing": None}, {"mvp": "gpt-4"})
+        again = self.store.add("lean", {"problem_description": "Noise"}, {"mvp": "Booth"})
+        other = self.store.add("lean", {"problem_description": "Noise"}, {"mvp": "Earplugs"})
+        self.assertEqual(first, again)
+        self.assertNotEqual(first, other)
+        self.assertEqual(len(self.store.page("lean")), 2)
+
+    def test_entries_load_with_inputs_and_outputs(self):
+        entry_id = self.store.add("lean", {"problem_description": "Noise  in\nplants"}, {"mvp": "Booth"}, {"mvp": "gpt-4"}, {"potential": 7.0})
+        entry = self.store.page()[0]
+        self.assertEqual((entry["title"], entry["models"], entry["scores"]), ("Noise in plants", {"mvp": "gpt-4"}, {"potential": 7.0}))
+        self.assertEqual(self.store.load(entry_id), {"inputs": {"problem_description": "Noise  in\nplants"}, "outputs": {"mvp": "Booth"}})
+        self.assertIsNone(self.store.load(entry_id + 1))
+
+    def test_keyset_pages_newest_first(self):
+        ids = [self.add(number) for number in range(7)]
+        self.add(99, app="compt")
+        pages, before = [], None
+        while True:
+            page = self.store.page("transformer", before=before, limit=3)
+            if not page:
+                break
+            pages.append([entry["id"] for entry in page])
+            before = page[-1]["id"]
+        self.assertEqual(pages, [ids[6:3:-1], ids[3:0:-1], ids[:1]])
+
+    def test_search_matches_every_word_as_a_prefix(self):
+        noise = self.add(1, text="Noise insulation for forging plants")
+        heat = self.add(2, text="Cooling for forging halls")
+        self.assertEqual([entry["id"] for entry in self.store.page(query="forg")], [heat, noise])
+        self.assertEqual([entry["id"] for entry in self.store.page(query="forging insul")], [noise])
+        self.assertEqual([entry["id"] for entry in self.store.page(query='"Problem 2"')], [heat])
+        self.assertEqual(self.store.page(query="steel"), [])
+
+    def test_scores_are_read_from_the_outputs(self):
+        with mock.patch.object(history, "_store", self.store), mock.patch.object(history, "HISTORY_ENABLED", True):
+            history.record("transformer", {"problem": "Noise"}, {"potential": "Text\nPOTENTIAL_SCORE: 8", "challenges": "CHALLENGE_SCORE: 3"})
+        self.assertEqual(self.store.page()[0]["scores"], {"potential": 8.0, "challenge": 3.0})
+
+
+if __name__ == "__main__":
+    unittest.main()
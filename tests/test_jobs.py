@@ -0,0 +1,106 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import jobs
+import llm_client
+
+
+class JobStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "jobs.sqlite")
+        patch = mock.patch.object(jobs.history, "record")
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def store(self):
+        store = jobs.JobStore(self.path, workers=4)
+        self.addCleanup(store._pool.shutdown)
+        return store
+
+    def wait(self, store, job_id, timeout=5):
+        until = time.monotonic() + timeout
+        while store.get(job_id)["status"] in jobs.ACTIVE and time.monotonic() < until:
+            time.sleep(0.02)
+        return store.get(job_id)
+
+    def insert_running(self, job_id, worker, beat=None):
+        db = sqlite3.connect(self.path)
+        with db:
+            db.execute("INSERT INTO jobs (id, kind, params, status, worker, created) VALUES (?, 'test', '{}', 'running', ?, ?)",
+                       (job_id, worker, time.time()))
+            if beat is not None:
+                db.execute("INSERT OR REPLACE INTO workers (id, beat) VALUES (?, ?)", (worker, beat))
+        db.close()
+
+    def test_outputs_and_status(self):
+        store = self.store()
+
+        def run(params, progress):
+            progress.update("a", "par")
+            progress.finish("a", llm_client.Completion("partial " + params["x"], "gpt-4"))
+
+        store.register("test", run)
+        job = self.wait(store, store.submit("test", {"x": "done"}))
+        self.assertEqual((job["status"], job["outputs"], job["models"]), ("done", {"a": "partial done"}, {"a": "gpt-4"}))
+
+    def test_orphaned_job_is_requeued(self):
+        self.store()
+        self.insert_running("gone", "old-server", beat=time.time() - 10 * jobs.HEARTBEAT_SECONDS)
+        self.insert_running("busy", "live-server", beat=time.time())
+        store = self.store()
+        ran = []
+        store.register("test", lambda params, progress: ran.append(progress.job_id))
+        self.assertEqual(self.wait(store, "gone")["status"], "done")
+        self.assertEqual(ran, ["gone"])
+        self.assertEqual(store.get("busy")["status"], "running")
+
+    def test_a_job_is_claimed_once(self):
+        store = self.store()
+        ran = []
+        store.register("test", lambda params, progress: ran.append(1))
+        job_id = store.submit("test", {})
+        self.wait(store, job_id)
+        # Late or duplicate submissions of the same job to the pool do not run it again
+        for _ in range(3):
+            store._pool.submit(store._run, job_id).result()
+        self.assertEqual(ran, [1])
+
+    def test_cancel_stops_before_the_next_stage(self):
+        store = self.store()
+        started, release, stages = threading.Event(), threading.Event(), []
+
+        def run(params, progress):
+            for stage in ("first", "second"):
+                progress.check()
+                stages.append(stage)
+                started.set()
+                release.wait(5)
+                progress.finish(stage, stage)
+
+        store.register("test", run)
+        job_id = store.submit("test", {})
+        started.wait(5)
+        store.cancel(job_id)
+        release.set()
+        job = self.wait(store, job_id)
+        self.assertEqual((job["status"], stages, job["outputs"]), ("cancelled", ["first"], {}))
+
+    def test_cancelled_progress_raises(self):
+        cancel = threading.Event()
+        progress = jobs.Progress(mock.Mock(), "job", cancel)
+        progress.check()
+        cancel.set()
+        for call in (progress.check, lambda: progress.update("a", "b"), lambda: progress.finish("a", "b")):
+            self.assertRaises(llm_client.Cancelled, call)
+
+
+if __name__ == "__main__":
+    unittest.main()
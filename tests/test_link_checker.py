@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import link_checker
+
+
+class ExtractUrlsTest(unittest.TestCase):
+    def test_markdown_autolinks_and_bare_urls(self):
+        text = (
+            "See [Acme](https://acme.example/about), <https://b.example/x_y> and https://c.example/path.\n"
+            "Also (https://d.example/q?a=1), and again https://acme.example/about!"
+        )
+        self.assertEqual(
+            link_checker.extract_urls(text),
+            ["https://acme.example/about", "https://b.example/x_y", "https://c.example/path", "https://d.example/q?a=1"],
+        )
+
+    def test_non_http_links_and_empty_text(self):
+        self.assertEqual(link_checker.extract_urls("ftp://a.example and mailto:x@y.example"), [])
+        self.assertEqual(link_checker.extract_urls(None), [])
+
+    def test_at_most_max_urls(self):
+        text = " ".join(f"https://site{i}.example/" for i in range(100))
+        self.assertEqual(len(link_checker.extract_urls(text)), link_checker.LINK_MAX_URLS)
+
+    def test_annotate(self):
+        checks = {
+            "https://a.example/": link_checker.LinkCheck("https://a.example/", True, 200, "Home"),
+            "https://b.example/": link_checker.LinkCheck("https://b.example/", False, 404),
+        }
+        text = link_checker.annotate("[A](https://a.example/) and https://b.example/.", checks)
+        self.assertEqual(text, "[A](https://a.example/) *(✅ live — “Home”)* and https://b.example/ *(❌ dead (404))*.")
+
+    # Page titles come from arbitrary sites and must not add images, links or formatting to the answer
+    def test_annotate_escapes_titles(self):
+        title = "![x](https://evil.example/t.png) [win](https://evil.example/) *bold* $x$ :red[hi] <b>"
+        checks = {"https://a.example/": link_checker.LinkCheck("https://a.example/", True, 200, title)}
+        text = link_checker.annotate("https://a.example/", checks)
+        self.assertEqual(
+            text,
+            "https://a.example/ *(✅ live — “\\!\\[x\\]\\(https\\://evil\\.example/t\\.png\\) \\[win\\]\\(https\\://evil\\.example/\\) "
+            "\\*bold\\* \\$x\\$ \\:red\\[hi\\] \\<b\\>”)*",
+        )
+
+
+class AddressTest(unittest.TestCase):
+    def test_non_public_addresses(self):
+        for address in ("127.0.0.1", "10.1.2.3", "192.168.0.1", "169.254.169.254", "::1", "::ffff:127.0.0.1", "0.0.0.0", "fe80::1%eth0", "224.0.0.1"):
+            self.assertFalse(link_checker._is_public(address), address)
+
+    def test_public_addresses(self):
+        for address in ("93.184.216.34", "2606:2800:220:1:248:1893:25c8:1946", "::ffff:93.184.216.34"):
+            self.assertTrue(link_checker._is_public(address), address)
+
+
+class CheckLinksTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import mock_openai
+
+        cls.server, base = mock_openai.start_server(mock_openai.MockSettings())
+        cls.base = base[:-len("/v1")]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        cache = link_checker.LinkCache(os.path.join(self.directory, "links.sqlite"))
+        # A fresh session per test, so no connection opened with the opt-in is reused without it
+        _, pool, _, background = link_checker._resources()
+        session = link_checker._new_session()
+        self.addCleanup(session.close)
+        self.patches = [
+            mock.patch.object(link_checker, "_resources", return_value=(session, pool, cache, background)),
+            mock.patch.object(link_checker, "LINK_ALLOW_PRIVATE", True),  # The mock server is on loopback
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_live_dead_and_slow_links(self):
+        live, dead, slow = f"{self.base}/pages/200?title=Review", f"{self.base}/pages/404", f"{self.base}/pages/200?delay=5"
+        checks = link_checker.check_links([live, dead, slow], deadline=1.0)
+        self.assertEqual((checks[live].live, checks[live].title), (True, "Review"))
+        self.assertEqual((checks[dead].live, checks[dead].status), (False, 404))
+        self.assertIsNone(checks[slow].live)
+
+    def test_loopback_is_refused_without_the_opt_in(self):
+        url = f"{self.base}/pages/200"
+        with mock.patch.object(link_checker, "LINK_ALLOW_PRIVATE", False):
+            check = link_checker.check_links([url], deadline=1.0)[url]
+        self.assertEqual((check.live, check.error), (False, "not a public address"))
+
+    # A public-looking host that resolves to loopback is refused by the address the connection actually reached
+    def test_host_resolving_to_loopback_is_refused(self):
+        import socket
+
+        port = int(self.base.rsplit(":", 1)[1])
+        url = f"http://rebinding.example:{port}/pages/200"
+        loopback = [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", ("127.0.0.1", port))]
+        with mock.patch.object(link_checker, "LINK_ALLOW_PRIVATE", False), mock.patch("socket.getaddrinfo", return_value=loopback):
+            check = link_checker.check_links([url], deadline=1.0)[url]
+        self.assertEqual((check.live, check.error), (False, "not a public address"))
+
+    def test_redirect_to_loopback_is_refused(self):
+        import socket
+
+        port = int(self.base.rsplit(":", 1)[1])
+        url = f"http://public.example:{port}/pages/302?location=http://internal.example:{port}/pages/200"
+        public = [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", ("127.0.0.1", port))]
+        # The first connection is let through as if it were public; the redirect's connection is checked again
+        peers = iter([True])
+        with mock.patch.object(link_checker, "LINK_ALLOW_PRIVATE", False), mock.patch("socket.getaddrinfo", return_value=public), \
+                mock.patch.object(link_checker, "_is_public", side_effect=lambda address: next(peers, False)):
+            check = link_checker.check_links([url], deadline=1.0)[url]
+        self.assertEqual((check.live, check.error), (False, "not a public address"))
+
+
+if __name__ == "__main__":
+    unittest.main()
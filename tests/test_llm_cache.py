@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import llm_cache
+
+
+class CacheKeyTest(unittest.TestCase):
+    def test_transport_params_do_not_change_the_key(self):
+        request = {"model": "gpt-4", "messages": [{"role": "user", "content": "hi"}], "temperature": 0}
+        self.assertEqual(llm_cache.cache_key(request), llm_cache.cache_key(dict(request, stream=True, request_timeout=5)))
+        self.assertNotEqual(llm_cache.cache_key(request), llm_cache.cache_key(dict(request, temperature=1)))
+        self.assertNotEqual(llm_cache.cache_key(request), llm_cache.cache_key(dict(request, model="gpt-4-turbo")))
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "cache.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_round_trip(self):
+        cache = llm_cache.ResponseCache(self.path)
+        self.assertIsNone(cache.get("k"))
+        cache.set("k", "välue")
+        self.assertEqual(cache.get("k"), "välue")
+        # Another process (here: another connection) sees the same entries
+        self.assertEqual(llm_cache.ResponseCache(self.path).get("k"), "välue")
+
+    def test_entries_expire_after_the_ttl(self):
+        cache = llm_cache.ResponseCache(self.path, ttl=0.1)
+        cache.set("k", "v")
+        self.assertEqual(cache.get("k"), "v")
+        time.sleep(0.15)
+        self.assertIsNone(cache.get("k"))
+
+    # Once over the byte budget the least recently used entries go first; a read counts as a use
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = llm_cache.ResponseCache(self.path, max_bytes=25)
+        cache.set("a", "x" * 10)
+        time.sleep(0.01)
+        cache.set("b", "x" * 10)
+        time.sleep(0.01)
+        cache.get("a")
+        time.sleep(0.01)
+        cache.set("c", "x" * 10)
+        self.assertEqual(cache.get("a"), "x" * 10)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), "x" * 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+from pipeline import solution_label, split_solutions
+
+
+class SplitSolutionsTest(unittest.TestCase):
+    def test_numbered_list(self):
+        text = "Here are three ideas:\n1. **Booth**: a quiet room\n2. Earplugs\nwith details\n3) Robots"
+        self.assertEqual(split_solutions(text), ["1. **Booth**: a quiet room", "2. Earplugs\nwith details", "3) Robots"])
+
+    def test_headings_and_solution_labels(self):
+        self.assertEqual(split_solutions("### 1. A\ntext\n### 2. B"), ["### 1. A\ntext", "### 2. B"])
+        self.assertEqual(split_solutions("**Solution 1:** A\n**Solution 2:** B"), ["**Solution 1:** A", "**Solution 2:** B"])
+
+    def test_only_the_next_number_starts_a_solution(self):
+        text = "1. Booth\n1. a step\n3. not a solution\n2. Earplugs\n   1. nested"
+        self.assertEqual(split_solutions(text), ["1. Booth\n1. a step\n3. not a solution", "2. Earplugs\n   1. nested"])
+
+    def test_unnumbered_or_empty(self):
+        self.assertEqual(split_solutions("  One idea only.\n"), ["One idea only."])
+        self.assertEqual(split_solutions("1. Just one"), ["1. Just one"])
+        self.assertEqual(split_solutions(""), [])
+        self.assertEqual(split_solutions(None), [])
+
+
+class SolutionLabelTest(unittest.TestCase):
+    def test_first_line_without_markup(self):
+        self.assertEqual(solution_label("### 1. **Acoustic  booth**\nDetails"), "1. Acoustic booth")
+
+    def test_long_lines_are_shortened(self):
+        label = solution_label("x" * 200, width=10)
+        self.assertEqual(label, "x" * 9 + "…")
+
+
+if __name__ == "__main__":
+    unittest.main()
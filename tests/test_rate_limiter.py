@@ -0,0 +1,100 @@
+import threading
+import time
+import unittest
+
+import rate_limiter
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_refills_at_the_per_minute_rate(self):
+        bucket = rate_limiter.TokenBucket(60)  # One per second
+        now = bucket.updated
+        bucket.take(60)
+        self.assertAlmostEqual(bucket.wait_time(1, now), 1.0)
+        self.assertAlmostEqual(bucket.wait_time(1, now + 0.5), 0.5)
+        self.assertEqual(bucket.wait_time(1, now + 1.0), 0.0)
+
+    def test_never_holds_more_than_its_capacity(self):
+        bucket = rate_limiter.TokenBucket(60)
+        bucket.adjust(1000)
+        self.assertEqual(bucket.available, 60)
+        bucket.wait_time(1, bucket.updated + 3600)
+        self.assertEqual(bucket.available, 60)
+
+    # An amount above the capacity only waits for a full bucket instead of forever
+    def test_oversized_amounts_wait_for_a_full_bucket(self):
+        bucket = rate_limiter.TokenBucket(60)
+        now = bucket.updated
+        self.assertEqual(bucket.wait_time(500, now), 0.0)
+        bucket.take(500)
+        self.assertEqual(bucket.available, 0)
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_settle_gives_back_unused_tokens(self):
+        limiter = rate_limiter.RateLimiter(100, 1000)
+        limiter.acquire(800)
+        self.assertFalse(limiter.try_acquire(800))
+        limiter.settle(800, 0)  # A failed request is not charged
+        self.assertTrue(limiter.try_acquire(800))
+
+    def test_acquire_gives_up_at_the_deadline(self):
+        limiter = rate_limiter.RateLimiter(100, 1000)
+        limiter.acquire(1000)
+        started = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            limiter.acquire(1000, deadline=started + 0.2)
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_acquire_gives_up_when_cancelled(self):
+        limiter = rate_limiter.RateLimiter(100, 1000)
+        limiter.acquire(1000)
+        cancel = threading.Event()
+        threading.Timer(0.1, cancel.set).start()
+        with self.assertRaises(TimeoutError):
+            limiter.acquire(1000, cancel=cancel)
+
+    def test_pause_holds_back_the_queue(self):
+        limiter = rate_limiter.RateLimiter(100, 1000)
+        limiter.pause(0.3)
+        self.assertTrue(limiter.paused())
+        self.assertFalse(limiter.try_acquire(1))
+        self.assertGreaterEqual(limiter.acquire(1), 0.2)
+
+    def test_requests_are_served_in_arrival_order(self):
+        limiter = rate_limiter.RateLimiter(6000, 6000)  # 100 tokens per second
+        limiter.acquire(6000)
+        order = []
+
+        def take(name, tokens):
+            limiter.acquire(tokens)
+            order.append(name)
+
+        large = threading.Thread(target=take, args=("large", 30))
+        large.start()
+        time.sleep(0.05)
+        small = threading.Thread(target=take, args=("small", 1))
+        small.start()
+        large.join(5)
+        small.join(5)
+        self.assertEqual(order, ["large", "small"])
+
+
+class EstimateTest(unittest.TestCase):
+    def test_estimate_covers_the_prompt_and_the_completion_budget(self):
+        request = {"messages": [{"role": "user", "content": "x" * 400}], "max_tokens": 50}
+        self.assertEqual(rate_limiter.estimate_tokens(request), 150)
+        del request["max_tokens"]
+        self.assertEqual(rate_limiter.estimate_tokens(request), 100 + rate_limiter.DEFAULT_COMPLETION_TOKENS)
+
+    def test_retry_after(self):
+        error = Exception()
+        error.headers = {"retry-after": "2.5"}
+        self.assertEqual(rate_limiter.retry_after(error), 2.5)
+        error.headers = {"retry-after": "soon"}
+        self.assertIsNone(rate_limiter.retry_after(error))
+        self.assertIsNone(rate_limiter.retry_after(Exception()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import time
+import unittest
+
+import resilience
+
+
+# Stand-ins for the openai and requests errors, which are classified by class name
+class RateLimitError(Exception):
+    pass
+
+
+class APIError(Exception):
+    def __init__(self, http_status=None):
+        super().__init__("api error")
+        self.http_status = http_status
+
+
+class ReadTimeout(Exception):
+    pass
+
+
+class ClassifyTest(unittest.TestCase):
+    def test_classes(self):
+        self.assertEqual(resilience.classify(RateLimitError()), resilience.RATE_LIMITED)
+        self.assertEqual(resilience.classify(ReadTimeout()), resilience.TRANSIENT)
+        self.assertEqual(resilience.classify(APIError(503)), resilience.TRANSIENT)
+        self.assertEqual(resilience.classify(APIError(None)), resilience.TRANSIENT)
+        self.assertEqual(resilience.classify(APIError(400)), resilience.FATAL)
+        self.assertEqual(resilience.classify(ValueError()), resilience.FATAL)
+
+    def test_backoff_is_jittered_below_the_cap(self):
+        for attempt in range(10):
+            delay = resilience.backoff(attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(resilience.RETRY_MAX_DELAY, resilience.RETRY_DELAY * 2 ** attempt))
+
+
+class RetryBudgetTest(unittest.TestCase):
+    def test_minimum_plus_ratio_of_calls(self):
+        budget = resilience.RetryBudget(ratio=0.5, minimum=2, window=60)
+        for _ in range(4):
+            budget.record_call()
+        granted = sum(budget.try_retry() for _ in range(10))
+        self.assertEqual(granted, 4)  # 2 + 0.5 * 4
+
+    def test_retries_age_out_of_the_window(self):
+        budget = resilience.RetryBudget(ratio=0, minimum=1, window=0.1)
+        self.assertTrue(budget.try_retry())
+        self.assertFalse(budget.try_retry())
+        time.sleep(0.15)
+        self.assertTrue(budget.try_retry())
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def breaker(self):
+        return resilience.CircuitBreaker("test-model", failure_rate=0.5, min_calls=4, window=60, cooldown=0.2)
+
+    def test_opens_once_enough_calls_failed(self):
+        breaker = self.breaker()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_success()
+        self.assertEqual(breaker.state(), "closed")  # Below min_calls
+        breaker.record_failure()
+        self.assertEqual(breaker.state(), "open")
+        with self.assertRaises(resilience.CircuitOpen):
+            breaker.before_call()
+        self.assertIsInstance(breaker.open_error(), resilience.CircuitOpen)
+
+    def test_stays_closed_below_the_failure_rate(self):
+        breaker = self.breaker()
+        for _ in range(3):
+            breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state(), "closed")
+        breaker.before_call()
+
+    def open_breaker(self):
+        breaker = self.breaker()
+        for _ in range(4):
+            breaker.record_failure()
+        time.sleep(0.25)
+        self.assertEqual(breaker.state(), "half-open")
+        self.assertIsNone(breaker.open_error())
+        return breaker
+
+    # After the cooldown a single probe goes through; its success closes the circuit
+    def test_half_open_probe_closes_on_success(self):
+        breaker = self.open_breaker()
+        breaker.before_call()
+        with self.assertRaises(resilience.CircuitOpen):
+            breaker.before_call()  # Only one probe at a time
+        breaker.record_success()
+        self.assertEqual(breaker.state(), "closed")
+        breaker.before_call()
+
+    def test_failed_probe_reopens(self):
+        breaker = self.open_breaker()
+        breaker.before_call()
+        breaker.record_failure()
+        self.assertEqual(breaker.state(), "open")
+        with self.assertRaises(resilience.CircuitOpen):
+            breaker.before_call()
+
+    # Calls that were already running when the circuit opened do not decide anything
+    def test_late_outcomes_are_ignored_while_open(self):
+        breaker = self.breaker()
+        for _ in range(4):
+            breaker.record_failure()
+        breaker.record_success()
+        self.assertEqual(breaker.state(), "open")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import unittest
+from unittest import mock
+
+import routing
+
+
+class ConfiguredRoutesTest(unittest.TestCase):
+    def test_override(self):
+        with mock.patch.dict(os.environ, {"LLM_ROUTES": "lean=gpt-4>gpt-3.5-turbo@20, compt.features=gpt-4-turbo,,ideas.x=a>"}):
+            table = routing._configured_routes()
+        self.assertEqual(table[("lean", "*")], ("gpt-4", "gpt-3.5-turbo", 20.0))
+        self.assertEqual(table[("compt", "features")], ("gpt-4-turbo", None, None))
+        self.assertEqual(table[("ideas", "x")], ("a", None, None))
+        self.assertEqual(table[("transformer", "*")], routing.ROUTES[("transformer", "*")])
+
+    def test_no_override(self):
+        with mock.patch.dict(os.environ, {"LLM_ROUTES": ""}):
+            self.assertEqual(routing._configured_routes(), routing.ROUTES)
+
+    def test_stage_routes_before_the_app_route(self):
+        with mock.patch.object(routing, "routes", {("compt", "competitors"): ("a", None, None), ("compt", "*"): ("b", None, None)}):
+            self.assertEqual(routing.get_route("compt", "competitors")[0], "a")
+            self.assertEqual(routing.get_route("compt", "features")[0], "b")
+            self.assertIsNone(routing.get_route("other", "x"))
+
+    def test_deadlines(self):
+        self.assertEqual(routing.get_deadline("lean", "mvp"), routing.DEADLINES[("lean", "*")])
+        self.assertEqual(routing.get_deadline("unknown", None), routing.DEFAULT_DEADLINE)
+
+
+class DegradationTest(unittest.TestCase):
+    def degradation(self, state="closed", paused=False, error_rate=None, p95=None, budget=None):
+        breaker = mock.Mock(state=mock.Mock(return_value=state))
+        limiter = mock.Mock(paused=mock.Mock(return_value=paused))
+        registry = mock.Mock(error_rate=mock.Mock(return_value=error_rate), quantile=mock.Mock(return_value=p95))
+        with mock.patch.object(routing.resilience, "get_breaker", return_value=breaker), \
+                mock.patch.object(routing.rate_limiter, "get_limiter", return_value=limiter), \
+                mock.patch.object(routing.metrics, "registry", registry):
+            return routing.degradation("gpt-4", budget)
+
+    def test_healthy(self):
+        self.assertIsNone(self.degradation(error_rate=0.1, p95=routing.LATENCY_BUDGET))
+
+    def test_reasons_in_order(self):
+        self.assertEqual(self.degradation(state="open", paused=True, error_rate=1.0), "circuit open")
+        self.assertEqual(self.degradation(paused=True, error_rate=1.0), "rate limited")
+        self.assertEqual(self.degradation(error_rate=0.5, p95=99), "50% errors")
+        self.assertEqual(self.degradation(p95=routing.LATENCY_BUDGET + 1), f"p95 first token {routing.LATENCY_BUDGET + 1:.1f}s")
+
+    def test_route_budget(self):
+        self.assertIsNone(self.degradation(p95=12, budget=15))
+        self.assertEqual(self.degradation(p95=16, budget=15), "p95 first token 16.0s")
+
+
+class ChooseModelTest(unittest.TestCase):
+    def choose(self, degraded, route=("primary", "fallback", None)):
+        with mock.patch.object(routing, "get_route", return_value=route), \
+                mock.patch.object(routing, "degradation", side_effect=lambda model, budget: "slow" if model in degraded else None):
+            return routing.choose_model("app", "stage", "default")
+
+    def test_primary_while_healthy(self):
+        self.assertEqual(self.choose(set()), "primary")
+
+    def test_fallback_while_the_primary_is_degraded(self):
+        self.assertEqual(self.choose({"primary"}), "fallback")
+
+    def test_primary_when_both_are_degraded(self):
+        self.assertEqual(self.choose({"primary", "fallback"}), "primary")
+
+    def test_without_fallback_or_route(self):
+        self.assertEqual(self.choose({"primary"}, ("primary", None, None)), "primary")
+        self.assertEqual(self.choose(set(), None), "default")
+
+
+if __name__ == "__main__":
+    unittest.main()
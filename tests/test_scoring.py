@@ -0,0 +1,36 @@
+import unittest
+
+from scoring import parse_score, strip_scores
+
+
+class ParseScoreTest(unittest.TestCase):
+    def test_plain_line(self):
+        self.assertEqual(parse_score("Analysis...\nPOTENTIAL_SCORE: 7", "potential"), 7.0)
+        self.assertEqual(parse_score("Analysis...\nCHALLENGE_SCORE: 4", "challenge"), 4.0)
+
+    def test_decorated_lines(self):
+        for line in ("**POTENTIAL_SCORE:** 8", "Potential score: 8/10", "- potential_score = 8", "`POTENTIAL_SCORE: 8`.", "### Potential Score: 8"):
+            self.assertEqual(parse_score(f"Text\n{line}", "potential"), 8.0, line)
+
+    def test_decimal_comma_and_clamping(self):
+        self.assertEqual(parse_score("POTENTIAL_SCORE: 7,5", "potential"), 7.5)
+        self.assertEqual(parse_score("POTENTIAL_SCORE: 12", "potential"), 10.0)
+        self.assertEqual(parse_score("POTENTIAL_SCORE: 0", "potential"), 1.0)
+
+    def test_the_last_line_wins(self):
+        self.assertEqual(parse_score("POTENTIAL_SCORE: 3\nOn reflection:\nPOTENTIAL_SCORE: 6", "potential"), 6.0)
+
+    def test_missing_or_other_scores(self):
+        self.assertIsNone(parse_score("No score here", "potential"))
+        self.assertIsNone(parse_score(None, "potential"))
+        self.assertIsNone(parse_score("CHALLENGE_SCORE: 5", "potential"))
+        self.assertIsNone(parse_score("The potential score: high", "potential"))
+        self.assertEqual(parse_score("CHALLENGES_SCORE: 5", "challenge"), 5.0)
+
+    def test_strip_scores(self):
+        self.assertEqual(strip_scores("Analysis.\n\n**POTENTIAL_SCORE:** 7\n"), "Analysis.")
+        self.assertEqual(strip_scores(None), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+import semantic_index
+
+# Labelled (inputs, inputs, same problem) pairs for checking the threshold: rewordings of one problem should score
+# above it, different problems from the same domain below it
+CALIBRATION_PAIRS = [
+    (
+        {"problem": "Workers in metal forging plants are exposed to constant noise.", "barrier": "Soundproofing is expensive and disrupts production.", "affected": "Production workers", "wish": "A quiet workplace without lost output"},
+        {"problem": "Forging plant staff suffer from permanent loud noise at work.", "barrier": "Noise insulation costs a lot and interrupts the line.", "affected": "Factory workers", "wish": "Less noise while keeping production running"},
+        True,
+    ),
+    (
+        {"problem": "Small restaurants throw away a lot of unsold food every evening.", "barrier": "Demand is hard to predict.", "affected": "Restaurant owners", "wish": "Less food waste and lower costs"},
+        {"problem": "Every night small restaurants discard large amounts of leftover food.", "barrier": "They cannot forecast how many guests will come.", "affected": "Owners of small restaurants", "wish": "Waste less food and save money"},
+        True,
+    ),
+    (
+        {"problem": "Workers in metal forging plants are exposed to constant noise.", "barrier": "Soundproofing is expensive and disrupts production.", "affected": "Production workers", "wish": "A quiet workplace without lost output"},
+        {"problem": "Workers in metal forging plants suffer from heat stress in summer.", "barrier": "Cooling large halls is expensive and disrupts production.", "affected": "Production workers", "wish": "A cool workplace without lost output"},
+        False,
+    ),
+    (
+        {"problem": "Small restaurants throw away a lot of unsold food every evening.", "barrier": "Demand is hard to predict.", "affected": "Restaurant owners", "wish": "Less food waste and lower costs"},
+        {"problem": "Small restaurants struggle to hire enough kitchen staff.", "barrier": "Wages are low and the hours are long.", "affected": "Restaurant owners", "wish": "A reliable team at lower costs"},
+        False,
+    ),
+    (
+        {"problem": "Patients forget to take their medication on time.", "barrier": "Reminders on phones are ignored.", "affected": "Elderly patients", "wish": "Taking the right pills at the right time"},
+        {"problem": "Elderly patients find it hard to book doctor appointments online.", "barrier": "Booking websites are confusing.", "affected": "Elderly patients", "wish": "Getting an appointment without help"},
+        False,
+    ),
+]
+
+
+def similarity(nlp, first, second):
+    vectors = [np.asarray(semantic_index.embed(nlp, semantic_index.problem_text(inputs)), dtype=np.float32) for inputs in (first, second)]
+    norms = [float(np.linalg.norm(vector)) for vector in vectors]
+    return float(vectors[0] @ vectors[1]) / (norms[0] * norms[1]) if all(norms) else 0.0
+
+
+# Needs the word vectors of en_core_web_md (requirements.txt); the threshold is unverified until this passes
+class ThresholdCalibrationTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.nlp = semantic_index._load_nlp()
+        if cls.nlp is None:
+            raise unittest.SkipTest(f"No spaCy model with word vectors is installed ({semantic_index.SPACY_MODEL})")
+
+    def test_pairs_fall_on_the_right_side_of_the_threshold(self):
+        for first, second, same in CALIBRATION_PAIRS:
+            score = similarity(self.nlp, first, second)
+            with self.subTest(first=first["problem"], second=second["problem"], score=round(score, 3)):
+                if same:
+                    self.assertGreaterEqual(score, semantic_index.SEMANTIC_THRESHOLD)
+                else:
+                    self.assertLess(score, semantic_index.SEMANTIC_THRESHOLD)
+
+
+# The store itself, with a fixed embedding so no model is needed
+class SemanticIndexTest(unittest.TestCase):
+    VECTORS = {"noise": [1.0, 0.0, 0.0], "loud noise": [0.99, 0.1, 0.0], "heat": [0.0, 1.0, 0.0], "": [0.0, 0.0, 0.0]}
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def index(self):
+        return semantic_index.SemanticIndex(self.directory.name, "test", self.VECTORS.__getitem__, 3, threshold=0.95)
+
+    def test_find_returns_the_closest_entry_above_the_threshold(self):
+        index = self.index()
+        index.add("noise", {"analyses": ["noise analysis"]})
+        index.add("heat", {"analyses": ["heat analysis"]})
+        match = index.find("loud noise")
+        self.assertEqual(match.entry, {"analyses": ["noise analysis"]})
+        self.assertGreater(match.score, 0.95)
+
+    def test_nothing_above_the_threshold(self):
+        index = self.index()
+        index.add("noise", {"analyses": []})
+        self.assertIsNone(index.find("heat"))
+        self.assertIsNone(index.find(""))
+
+    def test_entries_persist_and_half_written_rows_are_dropped(self):
+        self.index().add("noise", {"analyses": ["kept"]})
+        with open(self.index().entries_path, "ab") as f:
+            f.write(b'{"analyses": ["half')
+        index = self.index()
+        self.assertEqual(index.find("noise").entry, {"analyses": ["kept"]})
+        index.add("heat", {"analyses": ["after"]})
+        self.assertEqual(index.find("heat").entry, {"analyses": ["after"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+import unittest
+
+import singleflight
+
+
+class SingleFlightTest(unittest.TestCase):
+    # Run do() on a thread; returns the thread and a dict that receives its result or error and its tokens
+    def call(self, flight, key, fn, cancel=None, deadline=None):
+        outcome = {"tokens": []}
+
+        def run():
+            try:
+                outcome["result"] = flight.do(key, fn, outcome["tokens"].append, deadline, cancel)
+            except BaseException as e:
+                outcome["error"] = e
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread, outcome
+
+    def test_identical_calls_share_one_run(self):
+        flight = singleflight.SingleFlight()
+        runs = []
+        release = threading.Event()
+
+        def fn(publish, _):
+            runs.append(1)
+            publish("a")
+            release.wait(5)
+            publish("b")
+            return "ab"
+
+        first, first_outcome = self.call(flight, "k", fn)
+        time.sleep(0.1)
+        second, second_outcome = self.call(flight, "k", fn)
+        time.sleep(0.1)
+        release.set()
+        first.join(5)
+        second.join(5)
+        self.assertEqual(len(runs), 1)
+        for outcome in (first_outcome, second_outcome):
+            self.assertEqual(outcome["result"], "ab")
+            self.assertEqual(outcome["tokens"], ["a", "b"])
+
+    def test_errors_reach_every_caller(self):
+        flight = singleflight.SingleFlight()
+        release = threading.Event()
+
+        def fn(publish, _):
+            release.wait(5)
+            raise ValueError("upstream failed")
+
+        threads = [self.call(flight, "k", fn) for _ in range(2)]
+        time.sleep(0.1)
+        release.set()
+        for thread, outcome in threads:
+            thread.join(5)
+            self.assertIsInstance(outcome["error"], ValueError)
+
+    # The caller that started the call is cancelled after it streamed tokens: the other caller still gets the result
+    def test_cancelled_starter_detaches_without_failing_the_others(self):
+        flight = singleflight.SingleFlight()
+        cancel = threading.Event()
+        release = threading.Event()
+        upstream = {}
+
+        def fn(publish, current):
+            upstream["flight"] = current
+            for token in "abcdefgh":
+                publish(token)
+            release.wait(5)
+            publish("!")
+            return "abcdefgh!"
+
+        first, first_outcome = self.call(flight, "k", fn, cancel=cancel)
+        time.sleep(0.1)
+        second, second_outcome = self.call(flight, "k", fn)
+        time.sleep(0.1)
+        cancel.set()
+        first.join(5)
+        self.assertIsInstance(first_outcome["error"], TimeoutError)
+        self.assertFalse(upstream["flight"].cancel.is_set())
+        release.set()
+        second.join(5)
+        self.assertEqual(second_outcome["result"], "abcdefgh!")
+        self.assertEqual("".join(second_outcome["tokens"]), "abcdefgh!")
+
+    def test_last_caller_leaving_cancels_the_call(self):
+        flight = singleflight.SingleFlight()
+        cancel = threading.Event()
+        upstream = {}
+        runs = []
+
+        def fn(publish, current):
+            runs.append(1)
+            upstream["flight"] = current
+            current.cancel.wait(5)
+            return "late"
+
+        thread, outcome = self.call(flight, "k", fn, cancel=cancel)
+        time.sleep(0.1)
+        cancel.set()
+        thread.join(5)
+        self.assertIsInstance(outcome["error"], TimeoutError)
+        self.assertTrue(upstream["flight"].cancel.wait(1))
+        # A later caller starts a new call instead of joining the abandoned one
+        self.assertEqual(flight.do("k", lambda publish, current: "fresh"), "fresh")
+
+    def test_call_runs_until_the_latest_deadline(self):
+        flight = singleflight.SingleFlight()
+        seen = {}
+        release = threading.Event()
+
+        def fn(publish, current):
+            release.wait(5)
+            seen["deadline"] = current.deadline()
+            return "done"
+
+        now = time.monotonic()
+        first, _ = self.call(flight, "k", fn, deadline=now + 10)
+        time.sleep(0.1)
+        second, _ = self.call(flight, "k", fn, deadline=now + 20)
+        time.sleep(0.1)
+        release.set()
+        first.join(5)
+        second.join(5)
+        self.assertEqual(seen["deadline"], now + 20)
+
+
+class CoalescedCompletionTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault("OPENAI_API_KEY", "test")
+        import openai
+        import llm_cache
+        import llm_client
+        import mock_openai
+
+        # Every call has to reach the mock API
+        cls.cache_enabled, llm_cache.CACHE_ENABLED = llm_cache.CACHE_ENABLED, False
+        cls.settings = mock_openai.MockSettings("fixed:0.1", 0.02, 40)
+        cls.server, openai.api_base = mock_openai.start_server(cls.settings)
+        cls.llm_client = llm_client
+
+    @classmethod
+    def tearDownClass(cls):
+        import llm_cache
+
+        llm_cache.CACHE_ENABLED = cls.cache_enabled
+        cls.server.shutdown()
+
+    # The workshop case: one seat cancels after 8 streamed tokens, the other seat's identical call still completes
+    def test_leader_cancelled_mid_stream(self):
+        messages = [{"role": "user", "content": "coalesced stream test"}]
+        cancel = threading.Event()
+        outcome = {}
+        leader_tokens = []
+
+        def on_leader_token(token):
+            leader_tokens.append(token)
+            if len(leader_tokens) == 8:
+                cancel.set()
+
+        def leader():
+            try:
+                self.llm_client.complete(messages, on_token=on_leader_token, cache=True, cancel=cancel, temperature=0, app="test", stage="leader")
+            except Exception as e:
+                outcome["leader"] = e
+
+        def follower():
+            outcome["follower"] = self.llm_client.complete(messages, on_token=lambda token: None, cache=True, temperature=0, app="test", stage="follower")
+
+        requests_before = self.settings.requests
+        first = threading.Thread(target=leader)
+        first.start()
+        time.sleep(0.05)
+        second = threading.Thread(target=follower)
+        second.start()
+        first.join(10)
+        second.join(10)
+        self.assertIsInstance(outcome["leader"], self.llm_client.Cancelled)
+        self.assertEqual(len(outcome["follower"].split()), 40)
+        self.assertEqual(self.settings.requests - requests_before, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()